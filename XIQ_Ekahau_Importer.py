@@ -1,29 +1,45 @@
 #!/usr/bin/env python3
 import logging
 import argparse
+import asyncio
 import time
 import sys
 import os
 import inspect
 import shutil
 import getpass
-import pandas as pd
-import numpy as np
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pprint import pprint as pp
-from app.Ekahau_importer import Ekahau
-from app.ap_csv_importer import apSerialCSV
+# pandas, the Ekahau importer and the XIQ client are imported where they are used,
+# so --help, argument checks and the login prompt do not wait for them to load
+from app.image_cache import ImageCache
+from app.project_cache import ProjectCache
+from app.profiler import profiler
 from mapImportLogger import logger
-from app.xiq_exporter import XIQ
 current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 logger = logging.getLogger('MapImporter.Main')
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--external',action="store_true", help="Optional - adds External Account selection, to create floorplans and APs on external VIQ")
 parser.add_argument('--csv', type=str, help="Optional - Allows to import a CSV file that will match AP names to serial numbers") 
-args = parser.parse_args()
+parser.add_argument('--csv-match', choices=['exact', 'normalized', 'fuzzy'], default='exact', help="Optional - How AP names are matched to the CSV: exact, normalized to ignore case, whitespace and separators, or fuzzy to also propose similar names for the APs left unmatched (default exact)")
+parser.add_argument('--jobs', type=int, default=1, help="Optional - Number of floor images, or Ekahau files with --batch, to process at the same time (default 1)")
+parser.add_argument('--max-image-size', type=float, default=10, help="Optional - Largest floor image to upload in MB, images are recompressed or downscaled to fit (default 10)")
+parser.add_argument('--cache-dir', type=str, help="Optional - Directory to cache parsed Ekahau projects and processed floor images in, so unchanged files are not processed again on the next run")
+parser.add_argument('--batch', type=str, metavar='DIR', help="Optional - Imports every Ekahau (.esx) file in DIR using a single XIQ login")
+parser.add_argument('--cache-size', type=float, default=500, help="Optional - Largest size of the image cache in MB, least recently used images are removed first (default 500)")
+parser.add_argument('--concurrency', type=int, default=4, help="Optional - Number of XIQ calls made at the same time when creating buildings and floors (default 4)")
+parser.add_argument('--pool-size', type=int, default=10, help="Optional - Largest number of keep-alive connections kept open to XIQ, raised to --concurrency if lower (default 10)")
+parser.add_argument('--rate', type=float, help="Optional - Largest number of XIQ calls per second, calls beyond it wait for their turn (default no limit)")
+parser.add_argument('--burst', type=int, help="Optional - Number of XIQ calls that can be made at once before --rate applies (default the rate, at least 1)")
+parser.add_argument('--rate-lock', type=str, metavar='FILE', help="Optional - Shares the --rate limit with every other import on this host using the same FILE")
+parser.add_argument('--xiq-url', type=str, default='https://api.extremecloudiq.com', metavar='URL', help="Optional - Base URL of the XIQ API, such as a local benchmarks/mock_xiq.py server (default https://api.extremecloudiq.com)")
+parser.add_argument('--profile', type=str, metavar='REPORT', help="Optional - Writes a JSON report of the wall and CPU time of every import phase and XIQ API call to REPORT")
+parser.add_argument('--profile-stats', type=str, metavar='FILE', help="Optional - Writes cProfile stats of the main thread to FILE, to be read with pstats")
 
 PATH = current_dir
-imageFilePath = PATH + "/app/images/"
 
 # Git Shell Coloring - https://gist.github.com/vratiu/9780109
 RED   = "\033[1;31m"  
@@ -32,6 +48,9 @@ GREEN = "\033[0;32m"
 YELLOW = "\033[0;33m"
 RESET = "\033[0;0m"
 
+class ProjectImportError(Exception):
+    """A problem with one Ekahau project that stops its import. With --batch the next project is still imported."""
+
 
 def _create_char_spinner():
     """Creates a generator yielding a char based spinner.
@@ -178,10 +197,7 @@ def createSiteGroup(parent_id):
             validResponse = True
             data = {"parent_id": parent_id, "name": site_group_name}
         elif response == 'n':
-            sys.stdout.write(RED)
-            sys.stdout.write("script is exiting....\n")
-            sys.stdout.write(RESET)
-            raise SystemExit
+            raise ProjectImportError(f"Site group '{site_group_name}' was not created")
     siteGroupId = x.createLocation(site_group_name, data)
     if siteGroupId != 0:
         log_msg = (f"Site {site_group_name} was successfully created.")
@@ -244,10 +260,7 @@ def createSite(parent_id):
             validResponse = True
             data = {"parent_id": parent_id, "name": site_name, "country_code":country_code }
         elif response == 'n':
-            sys.stdout.write(RED)
-            sys.stdout.write("script is exiting....\n")
-            sys.stdout.write(RESET)
-            raise SystemExit
+            raise ProjectImportError(f"Site '{site_name}' was not created")
     siteId = x.createSite(site_name, data)
     if siteId != 0:
         log_msg = f"Site {site_name} was successfully created."
@@ -304,10 +317,7 @@ def createBuildingInfo(site_id, site_name):
             data = {"parent_id": site_id, "name": building_name, "address": building_address}
             return data
         elif response == 'n':
-            sys.stdout.write(RED)
-            sys.stdout.write("script is exiting....\n")
-            sys.stdout.write(RESET)
-            raise SystemExit
+            raise ProjectImportError(f"Building '{building_name}' was not created")
 
 def getNPFromList():
     data = x.collectNetworkPolicies()
@@ -350,53 +360,22 @@ def getNPByName():
             return np_data['data'][0]['id']
 
 
-def updateApWithId(ap):
-    global ek_ap_df
-    filt = ek_ap_df['sn'] == ap['serial_number']
-    ek_ap_df.loc[filt,'xiq_id'] = ap['id']
-
-
-## EKAHAU IMPORT
-filename = str(input("Please enter the Ekahau File: ")).strip()
-#filename = "Mayflower.esx"
-filename = filename.replace("\\ ", " ")
-filename = filename.replace("'", "")
-
-saveImages = False
-print("Gathering Ekahau Data.... ", end='')
-sys.stdout.flush()
-x = Ekahau(filename)
-try:
-    rawData = x.exportFile()
-except ValueError as e:
-    print("Failed")
-    sys.stdout.write(YELLOW)
-    sys.stdout.write(str(e) +'\n')
-    sys.stdout.write(RED)
-    sys.stdout.write("script is exiting....\n")
-    sys.stdout.write(RESET)
-    raise SystemExit
-except:
-    log_msg = "Unknown Error opening and exporting Ekahau data"
-    print("Failed")
-    print(log_msg)
-    logger.error(log_msg)
-    raise SystemExit
-#pprint(rawData)
-#print("\n\n")
-print("Complete\n")
-
-
-## CSV AP MAPPER
-if args.csv:
+def newEkahau(filename, jobs, imageDir):
+    from app.Ekahau_importer import Ekahau
+    return Ekahau(filename, jobs=jobs, maxImageBytes=int(args.max_image_size * 1000000), imageCache=imageCache, projectCache=projectCache, imageDir=imageDir)
+
+
+def mapSerialNumbers(rawData, csvFile):
+    from app.ap_csv_importer import apSerialCSV
     print("Gathering Serial Numbers from CSV file.... ", end='')
     sys.stdout.flush()
-    filename = args.csv
-    x = apSerialCSV(filename, rawData['aps'])
+    x = apSerialCSV(csvFile, rawData['aps'])
     try:
-        rawData['aps'], unmatched_ap_info_ap, unmatched_csv_ap = x.getSerialNumbers()
+        with profiler.span('main.mapSerialNumbers', aps=len(rawData['aps'])):
+            rawData['aps'], unmatched_ap_info_ap, unmatched_csv_ap = x.getSerialNumbers(match=args.csv_match)
     except ValueError as e:
         print(e)
+        return
     except:
         log_msg = "Unknown Error opening and exporting CSV data"
         sys.stdout.write(RED)
@@ -405,6 +384,20 @@ if args.csv:
         logger.error(log_msg)
         raise SystemExit
     print("Complete\n")
+    if x.normalizedMatches:
+        print("These APs were matched to a CSV name that only differs by case, whitespace or separators\n  ", end='')
+        print(*(f"{apName} -> {csvName}" for apName, csvName in x.normalizedMatches), sep='\n  ')
+    if x.proposals:
+        accepted = acceptProposals(x.proposals)
+        for ap, csvName, serial, score in accepted:
+            ap.sn = serial
+            rawData['aps'].append(ap)
+            logger.info(f"Proposed match {csvName} was accepted for {ap.name}")
+        acceptedNames = {ap.name for ap, _, _, _ in accepted}
+        acceptedCsvNames = {csvName for _, csvName, _, _ in accepted}
+        unmatched_ap_info_ap = [name for name in unmatched_ap_info_ap if name not in acceptedNames]
+        unmatched_csv_ap = [name for name in unmatched_csv_ap if name not in acceptedCsvNames]
+        x.unmatchedCsvRows -= len(acceptedCsvNames)
     if unmatched_ap_info_ap:
         print("These APs were not found in CSV\n  ", end='')
         print(*unmatched_ap_info_ap, sep='\n  ')
@@ -412,427 +405,616 @@ if args.csv:
     if unmatched_csv_ap:
         print("These APs were in the CSV but did not match the name of any AP\n  ", end='')
         print(*unmatched_csv_ap, sep='\n  ')
-        logger.warning("These APs were in the CSV file but did not match the name of any AP in Ekahau: " + ",".join(unmatched_csv_ap))
-    #pprint(rawData)
-    #print("\n\n")
+        if x.unmatchedCsvRows > len(unmatched_csv_ap):
+            print(f"  ...and {x.unmatchedCsvRows - len(unmatched_csv_ap)} more rows")
+        logger.warning(f"{x.unmatchedCsvRows} APs were in the CSV file but did not match the name of any AP in Ekahau")
+    conflicts = [name for name, serials in x.duplicates.items() if len(set(serials)) > 1]
+    if conflicts:
+        print("These APs are in the CSV more than once with different serial numbers, the serial number of the first row was used\n  ", end='')
+        print(*conflicts, sep='\n  ')
+
+
+def acceptProposals(proposals):
+    """Shows the proposed CSV names of unmatched APs and returns the proposals the user accepts"""
+    print("These APs were not found in the CSV but have a similar name in it")
+    for count, (ap, csvName, serial, score) in enumerate(proposals):
+        print(f"   {count}. {ap.name} -> {csvName} ({serial or 'no serial number'}, {score:.0%} similar)")
+    response = yesNoLoop("Would you like to use all of these matches?")
+    if response == 'y':
+        return proposals
+    response = yesNoLoop("Would you like to choose which matches to use?")
+    if response == 'n':
+        return []
+    accepted = []
+    for ap, csvName, serial, score in proposals:
+        if yesNoLoop(f"Use {csvName} for {ap.name}?") == 'y':
+            accepted.append((ap, csvName, serial, score))
+    return accepted
+
+
+def loginXIQ():
+    print("Enter your XIQ login credentials")
+    username = input("Email: ")
+    password = getpass.getpass("Password: ")
+
+    from app.xiq_exporter import XIQ
+    with profiler.span('main.login'):
+        # the pool holds a connection for every concurrent call, with pool_block a smaller pool would serialize the extra calls
+        xiq = XIQ(username,password,poolSize=max(args.pool_size, args.concurrency),rateLimiter=rateLimiter,url=args.xiq_url)
+    if args.external:
+        accounts, viqName = xiq.selectManagedAccount()
+        if accounts == 1:
+            validResponse = False
+            while validResponse != True:
+                response = input("No External accounts found. Would you like to import data to your network? (y/n)")
+                if response == 'y':
+                    validResponse = True
+                elif response =='n':
+                    sys.stdout.write("Thanks. ")
+                    sys.stdout.write(RED)
+                    sys.stdout.write("Script is exiting....\n")
+                    sys.stdout.write(RESET)
+                    raise SystemExit
+        elif accounts:
+            validResponse = False
+            while validResponse != True:
+                print("\nWhich VIQ would you like to import the floor plan and APs too?")
+                import pandas as pd
+                accounts_df = pd.DataFrame(accounts)
+                count = 0
+                for df_id, viq_info in accounts_df.iterrows():
+                    print(f"   {df_id}. {viq_info['name']}")
+                    count = df_id
+                print(f"   {count+1}. {viqName} (This is Your main account)\n")
+                selection = input(f"Please enter 0 - {count+1}: ")
+                try:
+                    selection = int(selection)
+                except:
+                    sys.stdout.write(YELLOW)
+                    sys.stdout.write("Please enter a valid response!!\n")
+                    sys.stdout.write(RESET)
+                    continue
+                if 0 <= selection <= count+1:
+                    validResponse = True
+                    if selection != count+1:
+                        newViqID = (accounts_df.loc[int(selection),'id'])
+                        newViqName = (accounts_df.loc[int(selection),'name'])
+                        xiq.switchAccount(newViqID, newViqName)
+    return xiq
 
-## XIQ EXPORT
 
-print("Enter your XIQ login credentials")
-username = input("Email: ")
-password = getpass.getpass("Password: ")
+def selectNetworkPolicy():
+    # Select Network Policy to use for devices
+    validResponse = False
+    while validResponse != True:
+        print("Would you like to select a network policy or search for a network policy?")
+        print("0 - Select from a list")
+        print("1 - Search by name")
+        selection = input(f"Please enter 0 - 1: ")
+        try:
+            selection = int(selection)
+        except:
+            sys.stdout.write(YELLOW)
+            sys.stdout.write("Please enter a valid response!!\n")
+            sys.stdout.write(RESET)
+            continue
+        if selection == 0:
+            np_id = getNPFromList()
+            validResponse = True
+        elif selection == 1:
+            np_id = getNPByName()
+            validResponse = True
+        else:
+            sys.stdout.write(YELLOW)
+            sys.stdout.write("Please enter a valid response!!\n")
+            sys.stdout.write(RESET)
+    return np_id
 
 
-x = XIQ(username,password)
-if args.external:
-    accounts, viqName = x.selectManagedAccount()
-    if accounts == 1:
-        validResponse = False
-        while validResponse != True:
-            response = input("No External accounts found. Would you like to import data to your network? (y/n)")
-            if response == 'y':
-                validResponse = True
-            elif response =='n':
-                sys.stdout.write("Thanks. ")
-                sys.stdout.write(RED)
-                sys.stdout.write("Script is exiting....\n")
-                sys.stdout.write(RESET)
-                raise SystemExit
-    elif accounts:
-        validResponse = False
-        while validResponse != True:
-            print("\nWhich VIQ would you like to import the floor plan and APs too?")
-            accounts_df = pd.DataFrame(accounts)
-            count = 0
-            for df_id, viq_info in accounts_df.iterrows():
-                print(f"   {df_id}. {viq_info['name']}")
-                count = df_id
-            print(f"   {count+1}. {viqName} (This is Your main account)\n")
-            selection = input(f"Please enter 0 - {count+1}: ")
-            try:
-                selection = int(selection)
-            except:
-                sys.stdout.write(YELLOW)
-                sys.stdout.write("Please enter a valid response!!\n")
-                sys.stdout.write(RESET)
-                continue
-            if 0 <= selection <= count+1:
-                validResponse = True
-                if selection != count+1:
-                    newViqID = (accounts_df.loc[int(selection),'id'])
-                    newViqName = (accounts_df.loc[int(selection),'name'])
-                    x.switchAccount(newViqID, newViqName)
-                    
-
-xiq_building_exist = False
-ekahau_building_exists = False
-
-location_df = x.gatherLocations()
-filt = location_df['type'] == 'BUILDING'
-building_df = location_df.loc[filt]
-filt = location_df['type'] == 'SITE'
-Site_df = location_df.loc[filt]
-filt = location_df['type'] == 'Site_Group'
-site_group_df = location_df.loc[filt]
-
-# Check Building
-if rawData['building']:
-    for building in rawData['building']:
-        #if not (lambda x: x['associated_building_id'] == building['building_id'], rawData['floors']):
-        if not any(d['associated_building_id'] == building['building_id'] for d in rawData['floors']):
-            log_msg = (f"no floors were found for building {building['name']}. Skipping creation of building")
+def buildOnboardList(aps, floors, np_id):
+    """Builds the advanced onboarding entries of aps, placed on the XIQ ids of their floors."""
+    xiqFloorIds = {floor.floor_id: str(floor.xiq_floor_id) for floor in floors}
+    onboard_list = []
+    for ap in aps:
+        data = {
+            "serial_number": ap.sn,
+            "location": {
+                "location_id": xiqFloorIds[ap.location_id],
+                "x": ap.x,
+                "y": ap.y,
+                "latitude": 0,
+                "longitude": 0
+            },
+            "network_policy_id": np_id,
+            "hostname": ap.name
+        }
+        onboard_list.append(data)
+    return onboard_list
+
+
+async def createLocations(xiq, pendingBuildings, pendingFloors, imageDir, summary, floorplanWait=10):
+    """Creates the planned buildings and floors in XIQ concurrently, each floor only waiting for its floorplan upload and building.
+
+    floorplanWait is the number of seconds XIQ is given to process an uploaded floorplan.
+    """
+    async def createBuilding(building, data):
+        building.xiq_building_id = await xiq.createBuilding(data)
+        summary['buildings'] += 1
+        if building.xiq_building_id != 0:
+            log_msg = f"Building {building.name} was successfully created."
+            sys.stdout.write(GREEN)
+            sys.stdout.write(log_msg+'\n\n')
+            sys.stdout.write(RESET)
             logger.info(log_msg)
-            continue
-        ekahau_building_exists = True
-        if building['name'] in building_df['name'].unique():
-            response = yesNoLoop(f"Building {building['name']} exists, would you like to add floorPlan(s) to it?")
-            if response == 'y':
-                xiq_building_exist = True
-                filt = location_df['name'] == building['name']
-                building_id = location_df.loc[filt, 'id'].values[0]
-                building['xiq_building_id'] = str(building_id)
-                logger.info(f"There is already a building with the name {building['name']} that will be used")
-            else:
-                print('Ok we will attempt to create a new building but it will have to be renamed.')
-                site_id, site_name = getParentSite()
-                data = createBuildingInfo(site_id,site_name)
-                building['name'] = data['name']
-                building['xiq_building_id'] = x.createBuilding(data)
-                if building['xiq_building_id'] != 0:
-                    log_msg = f"Building {building['name']} was successfully created."
-                    print(log_msg+'\n')
-                    logger.info(log_msg)
-        elif building['name'].lower() == 'building 1':
-            print(f"Building name is set to the default Ekahau building name - {building['name']}")
-            response = yesNoLoop("Would you like to change the name?")
-            if response == 'y':
-                print('Ok we will attempt to create a new building but it will have to be renamed.')
-                site_id, site_name = getParentSite()
-                data = createBuildingInfo(site_id,site_name)
-                building['name'] = data['name']
-                building['xiq_building_id'] = x.createBuilding(data)
-                if building['xiq_building_id'] != 0:
-                    log_msg = f"Building {building['name']} was successfully created."
-                    sys.stdout.write(GREEN)
-                    sys.stdout.write(log_msg+'\n\n')
-                    sys.stdout.write(RESET)
-                    logger.info(log_msg)
+
+    buildingTasks = {id(building): asyncio.create_task(createBuilding(building, data)) for building, data in pendingBuildings}
+
+    async def createFloor(floor, building, data):
+        if floor.map_name:
+            await xiq.uploadFloorplan(floor.map_name, floor.name, imageDir)
+            print(f"Uploaded {floor.map_name} for floor {floor.name} to XIQ\n")
+            # XIQ needs time to process the floorplan before a floor can use it
+            with profiler.span('main.floorplanWait', floor=floor.name):
+                await asyncio.sleep(floorplanWait)
+        if id(building) in buildingTasks:
+            await buildingTasks[id(building)]
+        data['parent_id'] = int(building.xiq_building_id)
+        floor.xiq_floor_id = await xiq.createFloor(data)
+        summary['floors'] += 1
+        if floor.xiq_floor_id != 0:
+            log_msg = f"Floor {floor.name} was successfully created."
+            sys.stdout.write(GREEN)
+            sys.stdout.write(log_msg+'\n\n')
+            sys.stdout.write(RESET)
+            logger.info(log_msg)
+
+    await asyncio.gather(*buildingTasks.values(), *(createFloor(floor, building, data) for floor, building, data in pendingFloors))
+
+
+def importProject(rawData, imageDir, np_id=None):
+    """Creates the buildings and floors of one Ekahau project in XIQ and onboards its APs, asking for the network policy if np_id is None.
+
+    Returns counts of the created buildings and floors and the onboarded and failed APs. Problems with the project raise ProjectImportError.
+    """
+    import pandas as pd
+    from app.Ekahau_importer import Building
+    global location_df, Site_df, site_group_df
+    summary = {'buildings': 0, 'floors': 0, 'onboarded': 0, 'failed': 0}
+    xiq_building_exist = False
+    ekahau_building_exists = False
+    # buildings and floors are planned first, asking every question, then created together
+    pendingBuildings = []
+    pendingFloors = []
+
+    # the serial numbers are checked before anything is created in XIQ
+    serialCounts = Counter(ap.sn for ap in rawData['aps'] if ap.sn)
+    duplicateSN = any(count > 1 for count in serialCounts.values())
+    if duplicateSN:
+        log_msg = ("Multiple APs have the same serial numbers. Please fix and try again.")
+        logger.warning(log_msg)
+        raise ProjectImportError(log_msg)
+    nanValues = [ap.name for ap in rawData['aps'] if not ap.sn]
+    onboardAPs = [ap for ap in rawData['aps'] if ap.sn]
+    if nanValues and not onboardAPs:
+        log_msg = ("Serial numbers were not found for any AP. Please check to make sure they are added correctly and try again.")
+        logger.warning(log_msg)
+        raise ProjectImportError(log_msg)
+
+    location_df = x.gatherLocations()
+    filt = location_df['type'] == 'BUILDING'
+    building_df = location_df.loc[filt]
+    filt = location_df['type'] == 'SITE'
+    Site_df = location_df.loc[filt]
+    filt = location_df['type'] == 'Site_Group'
+    site_group_df = location_df.loc[filt]
+
+    # Check Building
+    if rawData['building']:
+        for building in rawData['building']:
+            if not any(d.associated_building_id == building.building_id for d in rawData['floors']):
+                log_msg = (f"no floors were found for building {building.name}. Skipping creation of building")
+                logger.info(log_msg)
+                continue
+            ekahau_building_exists = True
+            if building.name in building_df['name'].unique():
+                response = yesNoLoop(f"Building {building.name} exists, would you like to add floorPlan(s) to it?")
+                if response == 'y':
+                    xiq_building_exist = True
+                    filt = location_df['name'] == building.name
+                    building_id = location_df.loc[filt, 'id'].values[0]
+                    building.xiq_building_id = str(building_id)
+                    logger.info(f"There is already a building with the name {building.name} that will be used")
+                else:
+                    print('Ok we will attempt to create a new building but it will have to be renamed.')
+                    site_id, site_name = getParentSite()
+                    data = createBuildingInfo(site_id,site_name)
+                    building.name = data['name']
+                    pendingBuildings.append((building, data))
+            elif building.name.lower() == 'building 1':
+                print(f"Building name is set to the default Ekahau building name - {building.name}")
+                response = yesNoLoop("Would you like to change the name?")
+                if response == 'y':
+                    print('Ok we will attempt to create a new building but it will have to be renamed.')
+                    site_id, site_name = getParentSite()
+                    data = createBuildingInfo(site_id,site_name)
+                    building.name = data['name']
+                    pendingBuildings.append((building, data))
+                else:
+                    site_id, site_name = getParentSite(building=building.name)
+                    data = building.payload(f"{site_id}")
+                    if not data['address']:
+                        data['address'] = {
+                                "address": "Unknown",
+                                "city": "Unknown",
+                                "state": "Unknown",
+                                "postal_code": "Unknown"
+                            }
+                    if data['name'] in building_df['name'].unique() or data['name'] in Site_df['name'].unique():
+                        print(f"{data['name']} has the same name as an existing sites. Buildings must have a unique name from other buildings and sites.")
+                        data = createBuildingInfo(site_id,site_name)
+                    elif len(data['name']) > 32:
+                        data['name'] = checkNameLength(data['name'], type='building')
+                    pendingBuildings.append((building, data))
+
             else:
-                data = building.copy()
-                site_id, site_name = getParentSite(building=building['name'])
-                del data['building_id']
-                del data['xiq_building_id']
-                if not data['address'].strip():
+                site_id, site_name = getParentSite(building=building.name)
+                data = building.payload(f"{site_id}")
+                if not data['address']:
                     data['address'] = {
-                            "address": "Unknown",
-                            "city": "Unknown",
-                            "state": "Unknown",
-                            "postal_code": "Unknown"
-                        }
-                data['parent_id'] = f"{site_id}"
-                if data['name'] in building_df['name'].unique() or data['name'] in Site_df['name'].unique():
+                                "address": "Unknown",
+                                "city": "Unknown",
+                                "state": "Unknown",
+                                "postal_code": "Unknown"
+                            }
+                if data['name'] in Site_df['name'].unique():
                     print(f"{data['name']} has the same name as an existing sites. Buildings must have a unique name from other buildings and sites.")
                     data = createBuildingInfo(site_id,site_name)
                 elif len(data['name']) > 32:
                     data['name'] = checkNameLength(data['name'], type='building')
-                building['xiq_building_id'] = x.createBuilding(data)
-                if building['xiq_building_id'] != 0:
-                    log_msg = f"Building {building['name']} was successfully created."
-                    sys.stdout.write(GREEN)
-                    sys.stdout.write(log_msg+'\n\n')
-                    sys.stdout.write(RESET)
-                    logger.info(log_msg)
-
-        else:
-            data = building.copy()
-            site_id, site_name = getParentSite(building=building['name'])
-            del data['building_id']
-            del data['xiq_building_id']
-            if not data['address']:
-                data['address'] = {
-                            "address": "Unknown",
-                            "city": "Unknown",
-                            "state": "Unknown",
-                            "postal_code": "Unknown"
-                        }
-            data['parent_id'] = f"{site_id}"
-            if data['name'] in Site_df['name'].unique():
-                print(f"{data['name']} has the same name as an existing sites. Buildings must have a unique name from other buildings and sites.")
-                data = createBuildingInfo(site_id,site_name)
-            elif len(data['name']) > 32:
-                data['name'] = checkNameLength(data['name'], type='building')
-            building['xiq_building_id'] = x.createBuilding(data)
-            if building['xiq_building_id'] != 0:
-                log_msg = f"Building {building['name']} was successfully created."
-                sys.stdout.write(GREEN)
-                sys.stdout.write(log_msg+'\n\n')
-                sys.stdout.write(RESET)
-                logger.info(log_msg)
+                pendingBuildings.append((building, data))
             
     
-if xiq_building_exist == False and ekahau_building_exists == False: 
-    site_id, site_name = getParentSite()
-    data = createBuildingInfo(site_id,site_name)
-    data['xiq_building_id'] = x.createBuilding(data)
-    if data['xiq_building_id'] != 0:
-        log_msg = f"Building {data['name']} was successfully created."
-        sys.stdout.write(GREEN)
-        sys.stdout.write(log_msg+'\n\n')
-        sys.stdout.write(RESET)
-        logger.info(log_msg)
-    del data['parent_id']
-    rawData['building'].append(data)
-
-# Create Floor(s)
-ek_building_df = pd.DataFrame(rawData['building'])
-if ekahau_building_exists == True:
-    for floor in rawData['floors']:
-        if floor['associated_building_id'] == None:
-            log_msg = f"Floor '{floor['name']}' is not associated with the buildings in Ekahau so it will be skipped."
-            logger.warning(log_msg)
-            sys.stdout.write(YELLOW)
-            sys.stdout.write(log_msg + '\n')
-            sys.stdout.write(RESET)
-            continue
-        filt = ek_building_df['building_id'] == floor['associated_building_id']
-        xiq_building_id = int(ek_building_df.loc[filt, 'xiq_building_id'].values[0])
-        building_name = ek_building_df.loc[filt, 'name'].values[0]
-        #check if floor exists
-        if xiq_building_exist == True:
-            filt = (location_df['type'] == 'FLOOR') & (location_df['parent'] == building_name)
-            floor_df = location_df.loc[filt]
-            if floor['name'] in floor_df['name'].unique():
-                log_msg = f"There is already a floor with the name {floor['name']} in building {building_name}"
+    # floors that are not associated with a building are placed in a new one
+    newBuilding = None
+    if xiq_building_exist == False and ekahau_building_exists == False: 
+        site_id, site_name = getParentSite()
+        data = createBuildingInfo(site_id,site_name)
+        newBuilding = Building(None, data['name'], data['address'])
+        rawData['building'].append(newBuilding)
+        pendingBuildings.append((newBuilding, data))
+
+    # Create Floor(s)
+    buildings = {building.building_id: building for building in rawData['building']}
+    if ekahau_building_exists == True:
+        for floor in rawData['floors']:
+            if floor.associated_building_id == None:
+                log_msg = f"Floor '{floor.name}' is not associated with the buildings in Ekahau so it will be skipped."
+                logger.warning(log_msg)
                 sys.stdout.write(YELLOW)
                 sys.stdout.write(log_msg + '\n')
                 sys.stdout.write(RESET)
-                print("Each floor has to have a unique name. Skipping creating this floor.")
-                response = yesNoLoop("Would you like to continue and place APs on floor that is already created?")
-                if response == 'n':
-                    sys.stdout.write(RED)
-                    sys.stdout.write("script is exiting....\n")
+                continue
+            building = buildings[floor.associated_building_id]
+            building_name = building.name
+            #check if floor exists
+            if xiq_building_exist == True:
+                filt = (location_df['type'] == 'FLOOR') & (location_df['parent'] == building_name)
+                floor_df = location_df.loc[filt]
+                if floor.name in floor_df['name'].unique():
+                    log_msg = f"There is already a floor with the name {floor.name} in building {building_name}"
+                    sys.stdout.write(YELLOW)
+                    sys.stdout.write(log_msg + '\n')
                     sys.stdout.write(RESET)
-                    logger.info(f"User selected to not place APs on existing floor {floor['name']}.")
-                    raise SystemExit
-                else:
-                    logger.info(log_msg + " that will be used.")
-                    filt = floor_df['name'] == floor['name']
-                    floor['xiq_floor_id'] = floor_df.loc[filt, 'id'].values[0]
-                    continue
+                    print("Each floor has to have a unique name. Skipping creating this floor.")
+                    response = yesNoLoop("Would you like to continue and place APs on floor that is already created?")
+                    if response == 'n':
+                        logger.info(f"User selected to not place APs on existing floor {floor.name}.")
+                        raise ProjectImportError(f"APs were not placed on the existing floor {floor.name}")
+                    else:
+                        logger.info(log_msg + " that will be used.")
+                        filt = floor_df['name'] == floor.name
+                        floor.xiq_floor_id = floor_df.loc[filt, 'id'].values[0]
+                        continue
+
+            # upload floorplan image
+            if " " in floor.map_name:
+                oldFileName = os.path.join(imageDir, floor.map_name)
+                floor.map_name = floor.map_name.replace(" ", "")
+                newFileName = os.path.join(imageDir, floor.map_name)
+                os.rename(oldFileName, newFileName)
+
+            # get data for floor, parent_id is set once the building is created
+            data = floor.payload(None)
+            if len(data['name']) > 32:
+                data['name'] = checkNameLength(data['name'], type='floor')
+            pendingFloors.append((floor, building, data))
 
-        # upload floorplan image
-        if 'FILE_TOO_BIG_' in floor['map_name']:
-            filename = floor['map_name'].replace("FILE_TOO_BIG_","")
-            floor['map_name'] = ''
-            log_msg = f"The image file for floor '{floor['name']}' is too big to upload using the API. Please upload {filename} located in the app/images folder and assign it to the floor."
-            logger.error(log_msg)
-            sys.stdout.write(YELLOW)
-            sys.stdout.write(log_msg + '\n')
-            sys.stdout.write(RESET)
-            saveImages = True
-        if " " in floor['map_name']:
-            oldFileName = imageFilePath + floor['map_name']
-            floor['map_name'] = floor['map_name'].replace(" ", "")
-            newFileName = imageFilePath + floor['map_name']
-            os.rename(oldFileName, newFileName)
-
-        if floor['map_name']:
-            print(f"Uploading {floor['map_name']} to XIQ.... ", end='')
-            sys.stdout.flush()
-            x.uploadFloorplan(floor['map_name'],floor['name'])
-            time.sleep(10)
-            print("Completed\n")
+    else:
+        for floor in rawData['floors']:
+            if floor.associated_building_id != None:
+                log_msg = ("Fatal Error with buildings and floors")
+                logger.error(log_msg)
+                raise ProjectImportError(log_msg)
+            # get data for floor, parent_id is set once the building is created
+            pendingFloors.append((floor, newBuilding, floor.payload(None)))
+
+    from app.xiq_exporter import AsyncXIQ
+    asyncXiq = AsyncXIQ(x, concurrency=args.concurrency)
+    try:
+        asyncio.run(createLocations(asyncXiq, pendingBuildings, pendingFloors, imageDir, summary))
+    finally:
+        asyncXiq.close()
+
+
+    if np_id is None:
+        np_id = selectNetworkPolicy()
+
+    # ADD APS TO FLOORS
+    # remove APs that do not have serial numbers
+    if nanValues:
+        print("\nSerial numbers were not found for these APs. Please correct and run the script again if you would like to add them.\n  ", end='')
+        print(*nanValues, sep = "\n  ")
+        logger.info("Serial numbers were not found for these APs: " + ",".join(nanValues))
+
+    # Build AP data
+    onboard_list = buildOnboardList(onboardAPs, rawData['floors'], np_id)
+
+    # Check number of APs onboarding
+    if len(onboard_list) > 30:
+        print("\nWith more the 30 APs onboarding, Long-running operation will be used.")
+        payload = {"extreme": onboard_list,
+                   "unmanaged": False
+                   }
+        lro_url = x.advanceOnboardAPs(payload,lro=True)
+        lro_result = 'PENDING'
+        with profiler.span('main.lroPolling', aps=len(onboard_list)) as attributes:
+            attributes['polls'] = 0
+            while lro_result != 'SUCCEEDED':
+                data = x.checkLRO(lro_url)
+                attributes['polls'] += 1
+                lro_result = data['metadata']['status']
+                print(f"\nThe long running operation's result is {lro_result}")
+                if lro_result != 'SUCCEEDED':
+                    print("Script will sleep for 30 secs and check again.")
+                    t = 120
+                    while t > 0:
+                        spinner()
+                        time.sleep(.25)
+                        t -= 1
+                    sys.stdout.write("\r  ")
+                    sys.stdout.flush()
+        response = data['response']
 
         
-        # get data for floor
-        data = floor.copy()
-        del data['associated_building_id']
-        del data['floor_id']
-        del data['xiq_floor_id']
-        data['parent_id'] = xiq_building_id
-        if len(data['name']) > 32:
-            data['name'] = checkNameLength(data['name'], type='floor')
-        floor['xiq_floor_id'] = x.createFloor(data)
-        if floor['xiq_floor_id'] != 0:
-            sys.stdout.write(GREEN)
-            sys.stdout.write(f"Floor {floor['name']} was successfully created.\n\n")
-            sys.stdout.write(RESET)
-        
-else:
-    for floor in rawData['floors']:
-        if floor['associated_building_id'] != None:
-            log_msg = ("Fatal Error with buildings and floors")
-            logger.error(log_msg)
-            sys.stdout.write(RED)
-            sys.stdout.write(log_msg + '\n')
-            sys.stdout.write("script is exiting....\n")
-            sys.stdout.write(RESET)
-            raise SystemExit
-        # upload floorplan image
-        print(f"Uploading {floor['map_name']} to XIQ.... ", end='')
-        sys.stdout.flush()
-        x.uploadFloorplan(floor['map_name'], floor['name'])
-        time.sleep(10)
-        print("Completed\n")
-        # get data for floor
-        data = floor.copy()
-        del data['associated_building_id']
-        del data['floor_id']
-        del data['xiq_floor_id']
-        data['parent_id'] = rawData['building'][0]['xiq_building_id']
-        floor['xiq_floor_id'] = x.createFloor(data)
-        if floor['xiq_floor_id'] != 0:
-            log_msg = (f"Floor {floor['name']} was successfully created.")
-            sys.stdout.write(GREEN)
-            sys.stdout.write(f"Floor {floor['name']} was successfully created.\n\n")
-            sys.stdout.write(RESET)
-            logger.info(log_msg)        
+    else:
+        payload = {"extreme": onboard_list,
+                   "unmanaged": False
+                   }
+        response = x.advanceOnboardAPs(payload)
+    
+    summary['onboarded'] = len(response.get('success_devices', []))
+    summary['failed'] = len(response.get('failure_devices', []))
+
+    # Log successes
+    if "success_devices" in response:
+        print("\nThe following devices were onboarded successfully:")
+        for device in response['success_devices']:
+            log_msg = f"Device {device['serial_number']} successfully onboarded created with id: {device['device_id']}"
+            print(log_msg)
+            logger.info(log_msg)
 
+    if "failure_devices" in response:
+        fd_df = pd.DataFrame(response['failure_devices'])
+        error_list = fd_df['error'].unique()
+        for error in error_list:
+            filt = fd_df['error'] == error
+            serials = fd_df.loc[filt,'serial_number'].values
+            if error == 'DEVICE_EXISTED':
+                print("\nThe following AP are already onboard in this XIQ instance:\n  ", end='')
+                print(*serials, sep='\n  ')
+                logger.warning("These AP serial numbers are already onboarded in this XIQ instance: " + ",".join(serials))
+                #response = yesNoLoop("Would you like to move these existing APs to the floorplan?")
+            elif error == 'EXIST_IN_REDIRECT':
+                print("\nTThese AP serial numbers were not able to be onboarded at this time as the serial numbers belong to another XIQ instance. Please check the serial numbers and try again:\n  ", end='')
+                print(*serials, sep='\n  ')
+                logger.warning("These AP serial numbers are already onboarded in this XIQ instance: " + ",".join(serials))
+            elif error == 'PRODUCT_TYPE_NOT_EXIST':
+                print("\nThese AP serial numbers are not valid. Please check serial numbers and try again:\n ", end='')
+                print(*serials, sep='\n  ')
+                logger.warning("These AP serial numbers are not valid: " + ",".join(serials))
+            else:
+                print(f"\nThese AP serial numbers failed to onboard with the error '{error}':")
+                print(*serials, sep='\n  ')
+                logger.warning(f"These AP serial numbers failed to onboard with '{error}': " + ",".join(serials))
+    return summary
 
-# Select Network Policy to use for devices
-validResponse = False
-while validResponse != True:
-    print("Would you like to select a network policy or search for a network policy?")
-    print("0 - Select from a list")
-    print("1 - Search by name")
-    selection = input(f"Please enter 0 - 1: ")
-    try:
-        selection = int(selection)
-    except:
-        sys.stdout.write(YELLOW)
-        sys.stdout.write("Please enter a valid response!!\n")
-        sys.stdout.write(RESET)
-        continue
-    if selection == 0:
-        np_id = getNPFromList()
-        validResponse = True
-    elif selection == 1:
-        np_id = getNPByName()
-        validResponse = True
-    else:
-        sys.stdout.write(YELLOW)
-        sys.stdout.write("Please enter a valid response!!\n")
-        sys.stdout.write(RESET)
 
+def printBatchSummary(summaries):
+    print("\nBatch import summary")
+    print(f"  {'Project':<40} {'Buildings':>9} {'Floors':>6} {'Onboarded':>9} {'Failed':>6}  Status")
+    for esxFile, summary in summaries.items():
+        print(f"  {esxFile:<40} {summary['buildings']:>9} {summary['floors']:>6} {summary['onboarded']:>9} {summary['failed']:>6}  {summary['status']}")
+        logger.info(f"Batch import of {esxFile}: {summary}")
 
-# ADD APS TO FLOORS
-ek_floor_df = pd.DataFrame(rawData['floors'])
-ek_ap_df = pd.DataFrame(rawData['aps'])
-# change location_id to xiq_floor_id
-listOfFloors = list(ek_ap_df['location_id'].unique())
-for floor_id in listOfFloors:
-    filt = ek_floor_df['floor_id'] == floor_id
-    xiq_id = (ek_floor_df.loc[filt,'xiq_floor_id'].values[0])
-    ek_ap_df = ek_ap_df.replace({'location_id':{floor_id : str(xiq_id)}})
-
-# get list of serial numbers
-ek_ap_df['sn'] = ek_ap_df['sn'].replace('', np.nan)
-duplicateSN = ek_ap_df['sn'].dropna().duplicated().any()
-if duplicateSN:
-    log_msg = ("\nMultiple APs have the same serial numbers. Please fix and try again.")
-    logger.warning(log_msg)
-    sys.stdout.write(RED)
-    sys.stdout.write(log_msg + '\n')
-    sys.stdout.write("script is exiting....")
-    sys.stdout.write(RESET)
-    raise SystemExit
-nanValues = ek_ap_df[ek_ap_df['sn'].isna()]
-ek_ap_df.dropna(subset=["sn"], inplace=True)
-# End script if no APs have serial numbers
-if nanValues.name.size > 0 and len(ek_ap_df['sn'].tolist()) == 0:
-    log_msg = ("\nSerial numbers were not found for any AP. Please check to make sure they are added correctly and try again.")
-    logger.warning(log_msg)
-    sys.stdout.write(YELLOW)
-    sys.stdout.write("\n"+log_msg + '\n')
-    print("script is exiting....")
-    sys.stdout.write(RESET)
-    raise SystemExit
-# remove APs that do not have serial numbers
-elif nanValues.name.size > 0:
-    print("\nSerial numbers were not found for these APs. Please correct and run the script again if you would like to add them.\n  ", end='')
-    print(*nanValues.name.values, sep = "\n  ")
-    logger.info("Serial numbers were not found for these APs: " + ",".join(nanValues.name.values))
-
-# Build AP data
-onboard_list = []
-for ap_id, ap_info in ek_ap_df.iterrows():
-    data = {
-        "serial_number": ap_info['sn'],
-        "location": {
-            "location_id": ap_info['location_id'],
-            "x": ap_info['x'],
-            "y": ap_info['y'],
-            "latitude": 0,
-            "longitude": 0
-        },
-        "network_policy_id": np_id,
-        "hostname": ap_info['name']
-    }
-    onboard_list.append(data)
-
-# Check number of APs onboarding
-if len(onboard_list) > 30:
-    print("\nWith more the 30 APs onboarding, Long-running operation will be used.")
-    payload = {"extreme": onboard_list,
-               "unmanaged": False
-               }
-    lro_url = x.advanceOnboardAPs(payload,lro=True)
-    lro_result = 'PENDING'
-    while lro_result != 'SUCCEEDED':
-        data = x.checkLRO(lro_url)
-        lro_result = data['metadata']['status']
-        print(f"\nThe long running operation's result is {lro_result}")
-        if lro_result != 'SUCCEEDED':
-            print("Script will sleep for 30 secs and check again.")
-            t = 120
-            while t > 0:
-                spinner()
-                time.sleep(.25)
-                t -= 1
-            sys.stdout.write("\r  ")
-            sys.stdout.flush()
-    response = data['response']
 
-        
-else:
-    payload = {"extreme": onboard_list,
-               "unmanaged": False
-               }
-    response = x.advanceOnboardAPs(payload)
-    
-# Log successes
-if "success_devices" in response:
-    print("\nThe following devices were onboarded successfully:")
-    for device in response['success_devices']:
-        log_msg = f"Device {device['serial_number']} successfully onboarded created with id: {device['device_id']}"
+def runBatch(directory, workspace):
+    global x
+    try:
+        esxFiles = sorted(f for f in os.listdir(directory) if f.lower().endswith('.esx'))
+    except OSError as e:
+        log_msg = f"Unable to read batch directory {directory}: {e}"
+        logger.error(log_msg)
         print(log_msg)
-        logger.info(log_msg)
+        raise SystemExit
+    if not esxFiles:
+        print(f"No Ekahau (.esx) files were found in {directory}")
+        raise SystemExit
+    summaries = {esxFile: {'buildings': 0, 'floors': 0, 'onboarded': 0, 'failed': 0, 'status': 'Not imported'} for esxFile in esxFiles}
+
+    ## EKAHAU IMPORT
+    print(f"Gathering Ekahau Data from {len(esxFiles)} files.... ")
+    ekahauFiles = {esxFile: newEkahau(os.path.join(directory, esxFile), jobs=1, imageDir=os.path.join(workspace, str(count)))
+                   for count, esxFile in enumerate(esxFiles)}
+    projects = {}
+    with profiler.span('main.exportFiles', files=len(esxFiles)), ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(ekahau.exportFile): esxFile for esxFile, ekahau in ekahauFiles.items()}
+        for future in as_completed(futures):
+            esxFile = futures[future]
+            try:
+                projects[esxFile] = future.result()
+            except ValueError as e:
+                summaries[esxFile]['status'] = f"Failed - {e}"
+                sys.stdout.write(YELLOW)
+                sys.stdout.write(f"  {esxFile}.... Failed - {e}\n")
+                sys.stdout.write(RESET)
+                continue
+            except Exception as e:
+                log_msg = f"Unknown Error opening and exporting Ekahau data from {esxFile}"
+                logger.error(f"{log_msg}: {e}")
+                summaries[esxFile]['status'] = f"Failed - {log_msg}"
+                print(f"  {esxFile}.... Failed")
+                continue
+            print(f"  {esxFile}.... Complete")
+    print()
+    if not projects:
+        printBatchSummary(summaries)
+        raise SystemExit
 
-if "failure_devices" in response:
-    fd_df = pd.DataFrame(response['failure_devices'])
-    error_list = fd_df['error'].unique()
-    for error in error_list:
-        filt = fd_df['error'] == error
-        serials = fd_df.loc[filt,'serial_number'].values
-        if error == 'DEVICE_EXISTED':
-            print("\nThe following AP are already onboard in this XIQ instance:\n  ", end='')
-            print(*serials, sep='\n  ')
-            logger.warning("These AP serial numbers are already onboarded in this XIQ instance: " + ",".join(serials))
-            #response = yesNoLoop("Would you like to move these existing APs to the floorplan?")
-        elif error == 'EXIST_IN_REDIRECT':
-            print("\nTThese AP serial numbers were not able to be onboarded at this time as the serial numbers belong to another XIQ instance. Please check the serial numbers and try again:\n  ", end='')
-            print(*serials, sep='\n  ')
-            logger.warning("These AP serial numbers are already onboarded in this XIQ instance: " + ",".join(serials))
-        elif error == 'PRODUCT_TYPE_NOT_EXIST':
-            print("\nThese AP serial numbers are not valid. Please check serial numbers and try again:\n ", end='')
-            print(*serials, sep='\n  ')
-            logger.warning("These AP serial numbers are not valid: " + ",".join(serials))
+    ## CSV AP MAPPER
+    if args.csv:
+        for esxFile in esxFiles:
+            if esxFile in projects:
+                print(f"{esxFile}: ", end='')
+                mapSerialNumbers(projects[esxFile], args.csv)
+
+    ## XIQ EXPORT
+    x = loginXIQ()
+    print("The same network policy will be used for the APs of every project.")
+    np_id = selectNetworkPolicy()
+    try:
+        for esxFile in esxFiles:
+            if esxFile not in projects:
+                continue
+            sys.stdout.write(BLUE)
+            sys.stdout.write(f"\nImporting {esxFile}\n")
+            sys.stdout.write(RESET)
+            try:
+                with profiler.span('main.importProject', file=esxFile):
+                    summaries[esxFile].update(importProject(projects[esxFile], ekahauFiles[esxFile].imageDir, np_id=np_id))
+            except ProjectImportError as e:
+                logger.error(f"Import of {esxFile} failed: {e}")
+                summaries[esxFile]['status'] = f"Failed - {e}"
+                sys.stdout.write(YELLOW)
+                sys.stdout.write(f"{e}\nContinuing with the next project....\n")
+                sys.stdout.write(RESET)
+                continue
+            summaries[esxFile]['status'] = 'Imported'
+    finally:
+        printBatchSummary(summaries)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be 1 or greater")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be 1 or greater")
+    if args.pool_size < 1:
+        parser.error("--pool-size must be 1 or greater")
+    if args.max_image_size <= 0:
+        parser.error("--max-image-size must be greater than 0")
+    if args.rate is None and (args.burst is not None or args.rate_lock):
+        parser.error("--burst and --rate-lock need --rate")
+
+    rateLimiter = None
+    if args.rate is not None:
+        from app.rate_limiter import RateLimiter
+        try:
+            rateLimiter = RateLimiter(args.rate, burst=args.burst, lockFile=args.rate_lock)
+        except ValueError as e:
+            parser.error(str(e))
+
+    imageCache = None
+    projectCache = None
+    if args.cache_dir:
+        try:
+            imageCache = ImageCache(os.path.join(args.cache_dir, 'images'), maxBytes=int(args.cache_size * 1000000))
+            projectCache = ProjectCache(os.path.join(args.cache_dir, 'projects'))
+        except ValueError as e:
+            print(e)
+            raise SystemExit
+
+    if args.profile:
+        profiler.enable()
+    if args.profile_stats:
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+
+    # each run works in its own workspace so several imports can run on the same host
+    workspace = tempfile.mkdtemp(prefix='xiq_ekahau_')
+    try:
+        if args.batch:
+            runBatch(args.batch, workspace)
         else:
-            print(f"\nThese AP serial numbers failed to onboard with the error '{error}':")
-            print(*serials, sep='\n  ')
-            logger.warning(f"These AP serial numbers failed to onboard with '{error}': " + ",".join(serials)) 
+            ## EKAHAU IMPORT
+            filename = str(input("Please enter the Ekahau File: ")).strip()
+            #filename = "Mayflower.esx"
+            filename = filename.replace("\\ ", " ")
+            filename = filename.replace("'", "")
 
+            print("Gathering Ekahau Data.... ", end='')
+            sys.stdout.flush()
+            try:
+                x = newEkahau(filename, jobs=args.jobs, imageDir=workspace)
+                with profiler.span('main.exportFile', file=os.path.basename(filename)):
+                    rawData = x.exportFile()
+            except ValueError as e:
+                print("Failed")
+                sys.stdout.write(YELLOW)
+                sys.stdout.write(str(e) +'\n')
+                sys.stdout.write(RED)
+                sys.stdout.write("script is exiting....\n")
+                sys.stdout.write(RESET)
+                raise SystemExit
+            except:
+                log_msg = "Unknown Error opening and exporting Ekahau data"
+                print("Failed")
+                print(log_msg)
+                logger.error(log_msg)
+                raise SystemExit
+            #pprint(rawData)
+            #print("\n\n")
+            print("Complete\n")
 
-if saveImages == False:
-    shutil.rmtree(imageFilePath)
+            ## CSV AP MAPPER
+            if args.csv:
+                mapSerialNumbers(rawData, args.csv)
 
+            ## XIQ EXPORT
+            x = loginXIQ()
+            try:
+                with profiler.span('main.importProject', file=os.path.basename(filename)):
+                    importProject(rawData, workspace)
+            except ProjectImportError as e:
+                sys.stdout.write(RED)
+                sys.stdout.write(f"\n{e}\n")
+                sys.stdout.write("script is exiting....\n")
+                sys.stdout.write(RESET)
+                raise SystemExit
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+        if rateLimiter and rateLimiter.delayed:
+            log_msg = f"{rateLimiter.delayed} of {rateLimiter.calls} XIQ calls waited for the rate limit, {rateLimiter.waited:.1f} secs in total"
+            logger.info(log_msg)
+            print(log_msg)
+        if args.profile_stats:
+            cprofile.disable()
+            cprofile.dump_stats(args.profile_stats)
+            print(f"cProfile stats written to {args.profile_stats}")
+        if args.profile:
+            try:
+                profiler.write(args.profile)
+                print(f"Profile report written to {args.profile}")
+            except ValueError as e:
+                print(e)
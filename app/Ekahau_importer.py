@@ -1,118 +1,455 @@
 #!/usr/bin/env python3
-from math import floor
-from zipfile import ZipFile
+from math import floor, sqrt
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from zipfile import BadZipFile, ZipFile, ZIP_STORED
 import json
 import logging
+import mmap
 import os
 import inspect
-import shutil
+import io
+import re
+import struct
 import sys
-import cv2
-import pandas as pd
+import tempfile
+# pandas, numpy and cv2 are imported where they are used, so a project cache hit or only using the
+# Building, Floor and AccessPoint records does not pay for loading them
 from pprint import pprint
 current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir) 
 from mapImportLogger import logger
+from app.profiler import profiler
 
 logger = logging.getLogger('MapImporter.EkahauImporter')
 
 PATH = current_dir
 
+# Per-floor raw image size, scale and crop box (in raw image pixels), built once by Ekahau
+FloorGeometry = namedtuple('FloorGeometry', ['imageId', 'imageType', 'rawWidth', 'rawHeight', 'x_scale', 'y_scale',
+                                             'minX', 'minY', 'maxX', 'maxY', 'metersPerUnit', 'rotateUpDirection'])
+
+class Building:
+    """A building of the Ekahau project and the id it has in XIQ once created."""
+    __slots__ = ('building_id', 'name', 'address', 'xiq_building_id')
+
+    def __init__(self, building_id, name, address, xiq_building_id=None):
+        self.building_id = building_id
+        self.name = name
+        self.address = address
+        self.xiq_building_id = xiq_building_id
+
+    def payload(self, parent_id):
+        return {'name': self.name, 'address': self.address, 'parent_id': parent_id}
+
+    def __repr__(self):
+        return f"Building({self.building_id!r}, {self.name!r}, xiq_building_id={self.xiq_building_id!r})"
+
+class Floor:
+    """A floor of the Ekahau project with its processed image, and the id it has in XIQ once created."""
+    __slots__ = ('floor_id', 'associated_building_id', 'name', 'environment', 'db_attenuation', 'measurement_unit',
+                 'installation_height', 'map_size_width', 'map_size_height', 'map_name', 'xiq_floor_id')
+
+    def __init__(self, floor_id, associated_building_id, name, db_attenuation, installation_height,
+                 map_size_width, map_size_height, map_name, environment="AUTO_ESTIMATE", measurement_unit="METERS",
+                 xiq_floor_id=None):
+        self.floor_id = floor_id
+        self.associated_building_id = associated_building_id
+        self.name = name
+        self.environment = environment
+        self.db_attenuation = db_attenuation
+        self.measurement_unit = measurement_unit
+        self.installation_height = installation_height
+        self.map_size_width = map_size_width
+        self.map_size_height = map_size_height
+        self.map_name = map_name
+        self.xiq_floor_id = xiq_floor_id
+
+    def payload(self, parent_id):
+        return {
+            "name": self.name,
+            "environment": self.environment,
+            "db_attenuation": self.db_attenuation,
+            "measurement_unit": self.measurement_unit,
+            "installation_height": self.installation_height,
+            "map_size_width": self.map_size_width,
+            "map_size_height": self.map_size_height,
+            "map_name": self.map_name,
+            "parent_id": parent_id
+        }
+
+    def __repr__(self):
+        return f"Floor({self.floor_id!r}, {self.name!r}, xiq_floor_id={self.xiq_floor_id!r})"
+
+class AccessPoint:
+    """An AP of the Ekahau project placed on floor location_id at x, y meters."""
+    __slots__ = ('xiq_id', 'name', 'sn', 'location_id', 'x', 'y')
+
+    def __init__(self, name, sn, location_id, x, y, xiq_id=None):
+        self.xiq_id = xiq_id
+        self.name = name
+        self.sn = sn
+        self.location_id = location_id
+        self.x = x
+        self.y = y
+
+    def __repr__(self):
+        return f"AccessPoint({self.name!r}, {self.sn!r}, {self.location_id!r}, {self.x!r}, {self.y!r})"
+
+def transformAPCoords(geometry, rawX, rawY):
+    """Converts the NumPy arrays rawX and rawY of AP coordinates of one floor from Ekahau map units to XIQ meters"""
+    minX, minY, maxX, maxY = geometry.minX, geometry.minY, geometry.maxX, geometry.maxY
+    metersPerUnit = geometry.metersPerUnit
+    orientation = geometry.rotateUpDirection
+    rawX = rawX * geometry.x_scale
+    rawY = rawY * geometry.y_scale
+
+    if orientation == 'UP':
+        x = (rawX - minX) * metersPerUnit
+        y = (rawY - minY) * metersPerUnit
+    elif orientation == "RIGHT":
+        y = (rawX - minX) * metersPerUnit
+        x = (maxY - rawY) * metersPerUnit
+    elif orientation == "LEFT":
+        x = (rawY - minY) * metersPerUnit
+        y = (maxX - rawX) * metersPerUnit
+    elif orientation == "DOWN":
+        x = (maxX - rawX) * metersPerUnit
+        y = (maxY - rawY) * metersPerUnit
+    else:
+        log_msg = f"Unknown floor rotation '{orientation}'"
+        logger.error(log_msg)
+        raise ValueError(log_msg)
+    return x, y
+
+@contextmanager
+def memberBuffer(zip, name):
+    """Yields a read-only buffer over the bytes of an archive member, only valid inside the with block"""
+    info = zip.getinfo(name)
+    # stored members are memory mapped out of the .esx file, compressed ones are inflated into one preallocated array
+    if info.compress_type == ZIP_STORED and not info.flag_bits & 0x1 and info.file_size and zip.filename:
+        with open(zip.filename, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = mm[info.header_offset:info.header_offset + 30]
+        if header[:4] != b'PK\x03\x04':
+            mm.close()
+        else:
+            nameLength, extraLength = struct.unpack('<HH', header[26:30])
+            start = info.header_offset + 30 + nameLength + extraLength
+            mapped = memoryview(mm)
+            view = mapped[start:start + info.file_size]
+            try:
+                yield view
+            except BaseException:
+                # the traceback of the error may still reference something made from the view, then the map
+                # cannot be closed yet and is left to the garbage collector instead of hiding the error
+                for release in (view.release, mapped.release, mm.close):
+                    try:
+                        release()
+                    except BufferError:
+                        pass
+                raise
+            view.release()
+            mapped.release()
+            mm.close()
+            return
+    import numpy as np
+    buffer = np.empty(info.file_size, np.uint8)
+    with memoryview(buffer) as view:
+        with profiler.span('ekahau.unzip', member=name, size=info.file_size), zip.open(info) as f:
+            pos = 0
+            while chunk := f.read(1 << 20):
+                view[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+        yield view
+
+def decodeImage(buffer):
+    """Decodes an image from a buffer returned by memberBuffer without copying it"""
+    import cv2
+    import numpy as np
+    data = np.frombuffer(buffer, np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    del data
+    return image
+
+def encodeJpeg(image, maxBytes, quality=75, minQuality=40, maxPasses=8):
+    """Encodes an image to JPEG under maxBytes, lowering the quality down to minQuality and then the size if needed.
+
+    Returns the encoded buffer, the quality used and the scale applied to the image.
+    """
+    import cv2
+    passes = 0
+    def encode(img, q):
+        nonlocal passes
+        passes += 1
+        status, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, q])
+        if not status:
+            raise ValueError("OpenCV failed to encode the image")
+        return buffer
+
+    buffer = encode(image, quality)
+    if buffer.size <= maxBytes:
+        return buffer, quality, 1.0
+    buffer = encode(image, minQuality)
+    if buffer.size <= maxBytes:
+        # the highest quality that fits is found with a binary search
+        best = (buffer, minQuality)
+        low, high = minQuality + 1, quality - 1
+        while low <= high and passes < maxPasses:
+            mid = (low + high) // 2
+            buffer = encode(image, mid)
+            if buffer.size <= maxBytes:
+                best = (buffer, mid)
+                low = mid + 1
+            else:
+                high = mid - 1
+        return best[0], best[1], 1.0
+
+    height, width = image.shape[:2]
+    scale = 1.0
+    while passes < maxPasses:
+        # encoded size is roughly proportional to the pixel count
+        scale *= sqrt(maxBytes / buffer.size) * 0.95
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        buffer = encode(cv2.resize(image, size, interpolation=cv2.INTER_AREA), minQuality)
+        if buffer.size <= maxBytes:
+            return buffer, minQuality, scale
+    raise ValueError(f"image could not be encoded under {maxBytes} bytes in {maxPasses} passes")
+
+def iterJsonArray(f, item, chunkSize=1 << 20):
+    """Yields the elements of the item array of the JSON member open as f one at a time, decoding it in chunks of chunkSize"""
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(f, encoding='utf-8')
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(item))
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def readMore():
+        nonlocal buffer, pos, eof
+        chunk = reader.read(chunkSize)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    # find the opening bracket of the array
+    while True:
+        match = start.search(buffer)
+        if match:
+            pos = match.end()
+            break
+        if eof:
+            raise json.JSONDecodeError(f"Expecting '{item}' array", buffer, 0)
+        readMore()
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise json.JSONDecodeError("Unterminated array", buffer, pos)
+            readMore()
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            readMore()
+            continue
+        after = end
+        while after < len(buffer) and buffer[after] in ' \t\r\n':
+            after += 1
+        if after == len(buffer) or buffer[after] not in ',]':
+            if eof:
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, after)
+            # the element may continue in the next chunk, a number cut at '-45' or '-45.' decodes as -45
+            readMore()
+            continue
+        yield element
+        pos = end
+
+def slimAccessPoint(ap):
+    # unplaced APs are dropped
+    if 'location' not in ap:
+        return None
+    location = ap['location']
+    return {
+        'id': ap['id'],
+        'name': ap['name'],
+        'location': {
+            'floorPlanId': location['floorPlanId'],
+            'coord': {'x': location['coord']['x'], 'y': location['coord']['y']}
+        }
+    }
+
+floorPlanFields = ['id', 'name', 'imageId', 'bitmapImageId', 'width', 'height', 'metersPerUnit',
+                   'cropMinX', 'cropMinY', 'cropMaxX', 'cropMaxY', 'rotateUpDirection']
+
+def slimFloorPlan(floorPlan):
+    return {field: floorPlan[field] for field in floorPlanFields if field in floorPlan}
+
+class EkahauProject:
+    """Lazy view of the JSON sections of an Ekahau 10.x .esx archive, each read and parsed the first time it is used"""
+    itemList = ['project', 'buildings', 'floorPlans', 'accessPoints', 'buildingFloors', 'floorTypes', 'images', 'notes', 'tagKeys', 'deviceProfiles']
+    optionalItems = ['buildings', 'buildingFloors', 'notes', 'tagKeys']
+    streamedItems = {'accessPoints': slimAccessPoint, 'floorPlans': slimFloorPlan}
+
+    def __init__(self, zip):
+        self.zip = zip
+        self.memberList = set(zip.namelist())
+        self.__sections = {}
+        self.__frames = {}
+
+    def __getattr__(self, item):
+        if item in EkahauProject.itemList:
+            return self.section(item)
+        raise AttributeError(item)
+
+    def has(self, item, ext='json'):
+        return f"{item}.{ext}" in self.memberList
+
+    def section(self, item):
+        if item not in self.__sections:
+            self.__sections[item] = self.__loadSection(item)
+        return self.__sections[item]
+
+    def frame(self, item):
+        if item not in self.__frames:
+            import pandas as pd
+            self.__frames[item] = pd.DataFrame(self.section(item)).set_index('id')
+        return self.__frames[item]
+
+    def __loadSection(self, item):
+        if not self.has(item):
+            if item in EkahauProject.optionalItems:
+                return None
+            logger.error(f"{item}.json file does not exist")
+            raise ValueError(f"The {item} details were able to be exported from the Ekahau file")
+        try:
+            with profiler.span('ekahau.parseSection', section=item), self.zip.open(f"{item}.json") as f:
+                if item in EkahauProject.streamedItems:
+                    # only the fields the importer uses are kept while the member is parsed
+                    slim = EkahauProject.streamedItems[item]
+                    return [element for element in map(slim, iterJsonArray(f, item)) if element is not None]
+                data = json.load(f)
+        except json.JSONDecodeError:
+            logger.info(f"{item}.json file is corrupted, script cannot proceed")
+            raise ValueError(f"The {item} details from Ekahau are corrupted, script cannot proceed")
+        except KeyError as e:
+            logger.info(f"{item}.json file is missing {e}, script cannot proceed")
+            raise ValueError(f"The {item} details from Ekahau are corrupted, script cannot proceed")
+        return data[item]
+
 class Ekahau:
-    def __init__(self, filename):
+    def __init__(self, filename, jobs=1, maxImageBytes=10000000, imageCache=None, projectCache=None, imageDir=None):
         self.filename = filename
+        self.jobs = max(1, jobs)
+        self.maxImageBytes = maxImageBytes
+        self.imageCache = imageCache
+        self.projectCache = projectCache
         self.metersPerUnit = {}
-        self.x_scale = 1
-        self.y_scale = 1
         self.cropRotateSupport = True
 
-        directory = PATH + '/images'
-        if os.path.isdir(directory):
-            for f in os.listdir(directory):
-                os.remove(os.path.join(directory, f))
+        # processed images are written to a workspace owned by this instance, never to a shared directory.
+        # Without an imageDir a temporary directory is created that the caller removes when it is done with the images.
+        if imageDir:
+            os.makedirs(imageDir, exist_ok=True)
+            self.imageDir = imageDir
         else:
-            os.makedirs(directory)
-        
-        self.projectFolder = f"{PATH}/project"
-        if os.path.exists(self.projectFolder) and os.path.isdir(self.projectFolder):
-            shutil.rmtree(self.projectFolder)
+            self.imageDir = tempfile.mkdtemp(prefix='ekahau_images_')
 
 
 
     def exportFile(self):
-        data = {}
-        itemList = ['project', 'buildings', 'floorPlans', 'accessPoints', 'buildingFloors', 'floorTypes', 'images', 'notes', 'tagKeys', 'deviceProfiles']
-        self.buildingexists = True
-        # Unzip Ekahau folder in to a created 'project' directory
+        # the project cache only references images kept by the image cache
+        useProjectCache = self.projectCache is not None and self.imageCache is not None
+        if useProjectCache:
+            with profiler.span('ekahau.projectCacheGet') as attributes:
+                cached = self.projectCache.get(self.filename, self.maxImageBytes)
+                hit = cached is not None and self.__writeCachedImages(cached[1])
+                attributes['hit'] = hit
+            if hit:
+                self.EkahauData = cached[0]
+                return self.EkahauData
+        self.imageKeys = {}
+        # Members are read straight out of the .esx archive, nothing is extracted to disk
         try:
             with ZipFile(self.filename, 'r') as zip:
-                zip.extractall('app/project')
+                self.zip = zip
+                self.__exportArchive()
         except FileNotFoundError:
             log_msg = f"{self.filename} file does not exist"
             logger.error(log_msg)
             raise ValueError(log_msg)
-        except json.JSONDecodeError:
+        except BadZipFile:
             log_msg = f"{self.filename} file is corrupted, script cannot proceed"
             logger.info(log_msg)
-            shutil.rmtree(self.projectFolder)
             raise ValueError(log_msg)
-        
+        finally:
+            self.zip = None
+        if useProjectCache:
+            with profiler.span('ekahau.projectCachePut'):
+                self.projectCache.put(self.filename, self.EkahauData, self.imageKeys, self.maxImageBytes)
+        return self.EkahauData
+
+    def __writeCachedImages(self, imageKeys):
+        # images are read from the image cache one at a time, False if one was evicted since the project was cached
+        for floorplan_name, cacheKey in imageKeys.items():
+            data = self.imageCache.get(cacheKey)
+            if data is None:
+                logger.info(f"{floorplan_name} is no longer in the image cache, {self.filename} is exported again")
+                return False
+            newfilename = os.path.join(self.imageDir, floorplan_name)
+            try:
+                with open(newfilename, 'wb') as f:
+                    f.write(data)
+            except OSError as e:
+                log_msg = f"Failed to write {newfilename} from the project cache: {e}"
+                logger.error(log_msg)
+                raise ValueError(log_msg)
+        return True
+
+    def __exportArchive(self):
+        self.project = EkahauProject(self.zip)
+
         #Check version
-        dir_list = os.listdir(self.projectFolder)
-        if 'project.xml' in dir_list:
+        if self.project.has('project', ext='xml'):
             log_msg = ("Older Ekahau file detected. Please update file using Ekahau 10.x and try again.")
             logger.error(log_msg)
-            shutil.rmtree(self.projectFolder)
             raise ValueError(log_msg)
-        # Import itemList json files 
-        for item in itemList:
-            try:
-                 with open(f"{self.projectFolder}/{item}.json", 'r') as f:
-                    data[item] = json.load(f)
-            except FileNotFoundError:
-                if item == 'buildings' or item == 'buildingFloors':
-                    self.buildingexists = False
-                    continue
-                elif item == 'notes' or item == 'tagKeys':
-                    continue
-                else:
-                    logger.error(f"{item}.json file does not exist")
-                    raise ValueError(f"The {item} details were able to be exported from the Ekahau file")
-            except json.JSONDecodeError:
-                logger.info(f"{item}.json file is corrupted, script cannot proceed")
-                raise ValueError(f"The {item} details from Ekahau are corrupted, script cannot proceed")
-        # clean APs:
-
-        ap_data = []
-        for ap in data['accessPoints']['accessPoints']:
-            if 'location' in ap:
-                ap_data.append(ap)
-        data['accessPoints']['accessPoints'] = ap_data
+        self.buildingexists = self.project.has('buildings') and self.project.has('buildingFloors')
 
         #TODO Need to set these values - 'notes', 'tagKeys', 'deviceProfiles'
-        self.project_info = data['project']['project']
-        if self.buildingexists:
-            self.building_df = pd.DataFrame(data['buildings']['buildings'])
-            self.building_df = self.building_df.set_index('id')
-        self.floorPlans_df = pd.DataFrame(data['floorPlans']['floorPlans'])
-        self.floorPlans_df = self.floorPlans_df.set_index('id')
-        self.ap_df = pd.DataFrame(data['accessPoints']['accessPoints'])
-        self.ap_df = self.ap_df.set_index('id')
-        if self.buildingexists:
-            self.buildingFloors_df = pd.DataFrame(data['buildingFloors']['buildingFloors'])
-            self.buildingFloors_df = self.buildingFloors_df.set_index('id')
-        self.floorTypes_df = pd.DataFrame(data['floorTypes']['floorTypes'])
-        self.floorTypes_df = self.floorTypes_df.set_index('id')
-        self.images_df = pd.DataFrame(data['images']['images'])
-        self.images_df = self.images_df.set_index('id')
+        self.project_info = self.project.section('project')
+        self.floorPlans_df = self.project.frame('floorPlans')
 
         self.__versionCheck()
+        with profiler.span('ekahau.floorGeometry'):
+            self.__buildFloorGeometry()
 
         self.__processEkahauData()
-        shutil.rmtree(current_dir + '/project')
-        return self.EkahauData
-        
+
+    @property
+    def building_df(self):
+        return self.project.frame('buildings')
+
+    @property
+    def buildingFloors_df(self):
+        return self.project.frame('buildingFloors')
+
+    @property
+    def floorTypes_df(self):
+        return self.project.frame('floorTypes')
+
+    @property
+    def images_df(self):
+        return self.project.frame('images')
+
     def __versionCheck(self):
         if 'rotateUpDirection' not in self.floorPlans_df.columns:
             log_msg = "This Ekahau file seems to be prior to version 10.3 so crop and rotation of Floors is not supported with this script."
@@ -125,22 +462,58 @@ class Ekahau:
             self.floorPlans_df = self.floorPlans_df.assign(cropMaxY = lambda x: x.height)
 
 
-    def __floorImageProcessing(self, imageId, imageType):
+    def __buildFloorGeometry(self):
+        # One pass over the floor plans, image processing and AP coordinates read from this index
+        import pandas as pd
+        images = self.images_df[['resolutionWidth', 'resolutionHeight']].to_dict('index')
+        self.floorGeometry = {}
+        for floor_id, row in self.floorPlans_df.to_dict('index').items():
+            if pd.notna(row.get('bitmapImageId')):
+                imageType = 'bitmap'
+                imageId = row['bitmapImageId']
+            else:
+                imageType = 'regular'
+                imageId = row['imageId']
+            try:
+                rawWidth = int(images[imageId]['resolutionWidth'])
+                rawHeight = int(images[imageId]['resolutionHeight'])
+            except KeyError:
+                log_msg = f"Image {imageId} for floor {row['name']} was not found in the Ekahau file"
+                logger.error(log_msg)
+                raise ValueError(log_msg)
+            x_scale = rawWidth / int(row['width'])
+            y_scale = rawHeight / int(row['height'])
+            self.floorGeometry[floor_id] = FloorGeometry(
+                imageId = imageId,
+                imageType = imageType,
+                rawWidth = rawWidth,
+                rawHeight = rawHeight,
+                x_scale = x_scale,
+                y_scale = y_scale,
+                minX = int(int(row['cropMinX']) * x_scale),
+                minY = int(int(row['cropMinY']) * y_scale),
+                maxX = int(int(row['cropMaxX']) * x_scale),
+                maxY = int(int(row['cropMaxY']) * y_scale),
+                metersPerUnit = row['metersPerUnit'],
+                rotateUpDirection = row['rotateUpDirection']
+            )
 
-        if imageType == 'bitmap':
-            filt = self.floorPlans_df['bitmapImageId'] == imageId    
-        else:
-            filt = self.floorPlans_df['imageId'] == imageId
-        rawWidth = int(self.images_df.loc[imageId, 'resolutionWidth'])
-        rawHeight = int(self.images_df.loc[imageId, 'resolutionHeight'])
-        self.x_scale = rawWidth / int(self.floorPlans_df.loc[filt, 'width'].values[0])
-        self.y_scale = rawHeight / int(self.floorPlans_df.loc[filt, 'height'].values[0])
+    def __processFloorImages(self, floorIds):
+        # OpenCV releases the GIL while decoding, rotating and encoding so floors are processed on a thread pool.
+        # executor.map returns the results in floor order.
+        if self.jobs == 1 or len(floorIds) < 2:
+            return [self.__floorImageProcessing(floor_id) for floor_id in floorIds]
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(floorIds))) as executor:
+            return list(executor.map(self.__floorImageProcessing, floorIds))
 
-        floorName = self.floorPlans_df.loc[filt, 'name'].values[0]
-        imageFormat = (self.images_df.loc[imageId, 'imageFormat'])
-        orientation = self.floorPlans_df.loc[filt, 'rotateUpDirection'].values[0]
+    def __floorImageProcessing(self, floor_id):
+        import cv2
+        geometry = self.floorGeometry[floor_id]
+        imageId = geometry.imageId
+        rawWidth = geometry.rawWidth
+        rawHeight = geometry.rawHeight
+        orientation = geometry.rotateUpDirection
 
-        
         #if imageFormat == 'JPEG':
         fileExt = 'jpg'
         #elif imageFormat == 'PNG':
@@ -148,92 +521,124 @@ class Ekahau:
     
 
         floorplan_name = f"{imageId}.{fileExt}"
-        filename = f"{self.projectFolder}/image-{imageId}"
-        newfilename = f"{PATH}/images/{floorplan_name}"
-        try:
-            file_size = os.path.getsize(filename)
-        except FileNotFoundError:
-            if not os.path.isfile(filename):
-                log_msg = f"{filename} file does not exist"
-                logger.error(log_msg)
-                raise ValueError(log_msg)
-            elif not os.path.isdir(PATH + '/images/'):
-                log_msg = "The /images/ directory is missing in the /app/ directory."
-                logger.error(log_msg)
-                raise ValueError(log_msg)
-        quality = 75
-        if file_size > 24550000:
-            quality = 50
-        image = cv2.imread(filename)
-        if image is None:
-            log_msg = f"Script failed to read in file {filename}"
+        filename = f"image-{imageId}"
+        newfilename = os.path.join(self.imageDir, floorplan_name)
+        if filename not in self.project.memberList:
+            log_msg = f"{filename} file does not exist in {self.filename}"
             logger.error(log_msg)
             raise ValueError(log_msg)
-            
-       
-        #Cropping image as necessary
-        minX=int(int(self.floorPlans_df.loc[filt, 'cropMinX'].values[0]) * self.x_scale)
-        minY=int(int(self.floorPlans_df.loc[filt, 'cropMinY'].values[0]) * self.y_scale)
-        maxX=int(int(self.floorPlans_df.loc[filt, 'cropMaxX'].values[0]) * self.x_scale)
-        maxY=int(int(self.floorPlans_df.loc[filt, 'cropMaxY'].values[0]) * self.y_scale)
-        #print(minY,maxY, minX,maxX)
-        crop_image = image[minY:maxY, minX:maxX]
-    
-        #Get width and height of the floorplan
-        width = (rawWidth - minX - (rawWidth -maxX)) * self.floorPlans_df.loc[filt, 'metersPerUnit'].values[0]
-        height = (rawHeight - minY - (rawHeight -maxY)) * self.floorPlans_df.loc[filt, 'metersPerUnit'].values[0]
+        if not os.path.isdir(self.imageDir):
+            log_msg = f"The image directory {self.imageDir} is missing."
+            logger.error(log_msg)
+            raise ValueError(log_msg)
+        minX, minY, maxX, maxY = geometry.minX, geometry.minY, geometry.maxX, geometry.maxY
 
-        #rotate image and width height of floorplan
-        if orientation == "LEFT":
-            image = cv2.rotate(crop_image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            width, height = height, width
-        elif orientation == "RIGHT":
-            image = cv2.rotate(crop_image, cv2.ROTATE_90_CLOCKWISE)
+        #Get width and height of the floorplan
+        width = (rawWidth - minX - (rawWidth -maxX)) * geometry.metersPerUnit
+        height = (rawHeight - minY - (rawHeight -maxY)) * geometry.metersPerUnit
+        if orientation == "LEFT" or orientation == "RIGHT":
             width, height = height, width
-        elif orientation == "DOWN":
-            image = cv2.rotate(crop_image, cv2.ROTATE_180) 
-        elif orientation == "UP":
-            image = crop_image
+
+        buffer = None
+        with memberBuffer(self.zip, filename) as source:
+            if self.imageCache:
+                with profiler.span('ekahau.imageCacheGet', floor=floor_id) as attributes:
+                    cacheKey = self.imageCache.key(source, minX, minY, maxX, maxY, orientation, self.maxImageBytes)
+                    self.imageKeys[floorplan_name] = cacheKey
+                    buffer = self.imageCache.get(cacheKey)
+                    attributes['hit'] = buffer is not None
+            if buffer is None:
+                with profiler.span('opencv.decode', floor=floor_id):
+                    image = decodeImage(source)
+        if buffer is not None:
+            logger.info(f"Using cached image for {floorplan_name}")
+        else:
+            if image is None:
+                log_msg = f"Script failed to read in file {filename}"
+                logger.error(log_msg)
+                raise ValueError(log_msg)
+
+            with profiler.span('opencv.rotate', floor=floor_id, orientation=orientation):
+                #Cropping image as necessary
+                crop_image = image[minY:maxY, minX:maxX]
+
+                #rotate image
+                if orientation == "LEFT":
+                    image = cv2.rotate(crop_image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+                elif orientation == "RIGHT":
+                    image = cv2.rotate(crop_image, cv2.ROTATE_90_CLOCKWISE)
+                elif orientation == "DOWN":
+                    image = cv2.rotate(crop_image, cv2.ROTATE_180) 
+                elif orientation == "UP":
+                    image = crop_image
+
+            #encode under the upload limit, width and height in meters do not change if the image is downscaled
+            try:
+                with profiler.span('opencv.encode', floor=floor_id) as attributes:
+                    buffer, quality, scale = encodeJpeg(image, self.maxImageBytes)
+                    attributes.update(quality=quality, scale=scale, size=len(buffer))
+            except ValueError as e:
+                log_msg = f"Failed to encode {floorplan_name} after cropping: {e}"
+                logger.error(log_msg)
+                raise ValueError(log_msg)
+            if scale < 1:
+                logger.info(f"{floorplan_name} was downscaled to {scale:.0%} and encoded with quality {quality} to fit under {self.maxImageBytes} bytes")
+            elif quality != 75:
+                logger.info(f"{floorplan_name} was encoded with quality {quality} to fit under {self.maxImageBytes} bytes")
+            if self.imageCache:
+                self.imageCache.put(cacheKey, buffer)
 
         #write cropped and rotated image file
-        write_status = cv2.imwrite(newfilename, image, [cv2.IMWRITE_JPEG_QUALITY, quality])
-        if not write_status:
-            log_msg = f"Failed to write {newfilename} after cropping"
+        try:
+            with profiler.span('ekahau.writeImage', floor=floor_id), open(newfilename, 'wb') as f:
+                f.write(buffer)
+        except OSError as e:
+            log_msg = f"Failed to write {newfilename} after cropping: {e}"
             logger.error(log_msg)
             raise ValueError(log_msg)
-        
-        file_size = os.path.getsize(newfilename)
-        if file_size > 10000000:
-            floorplan_name = 'FILE_TOO_BIG_' + floorplan_name
         return floorplan_name, width, height
 
-    def __updateAPCoord(self, floor_id, rawX,rawY):
-        #get correct x,y coords
-        minX=int(int(self.floorPlans_df.loc[floor_id, 'cropMinX']) * self.x_scale)
-        minY=int(int(self.floorPlans_df.loc[floor_id, 'cropMinY']) * self.y_scale)
-        maxX=int(int(self.floorPlans_df.loc[floor_id, 'cropMaxX']) * self.x_scale)
-        maxY=int(int(self.floorPlans_df.loc[floor_id, 'cropMaxY']) * self.y_scale)
-        metersPerUnit = self.floorPlans_df.loc[floor_id, 'metersPerUnit']
-        orientation = self.floorPlans_df.loc[floor_id, 'rotateUpDirection']
-        rawX = rawX  * self.x_scale
-        rawY = rawY  * self.y_scale
-
-        if orientation == 'UP':
-            x = (rawX - minX) * metersPerUnit
-            y = (rawY - minY) * metersPerUnit
-        elif orientation == "RIGHT":
-            y = (rawX - minX) * metersPerUnit
-            x = (maxY - rawY) * metersPerUnit
-        elif orientation == "LEFT":
-            x = (rawY - minY) * metersPerUnit
-            y = (maxX - rawX) * metersPerUnit
-        elif orientation == "DOWN":
-            x = (maxX - rawX) * metersPerUnit
-            y = (maxY - rawY) * metersPerUnit
-        
-        return x,y
-        
+    def __updateAPCoords(self, floorIds, rawX, rawY):
+        # group APs by floor so each floor is transformed as one array operation
+        import numpy as np
+        floorIndex = {}
+        for i, floor_id in enumerate(floorIds):
+            floorIndex.setdefault(floor_id, []).append(i)
+        rawX = np.asarray(rawX, dtype=np.float64)
+        rawY = np.asarray(rawY, dtype=np.float64)
+        x = np.empty_like(rawX)
+        y = np.empty_like(rawY)
+        for floor_id, index in floorIndex.items():
+            try:
+                geometry = self.floorGeometry[floor_id]
+            except KeyError:
+                log_msg = f"APs are placed on floor {floor_id} which was not found in the Ekahau file"
+                logger.error(log_msg)
+                raise ValueError(log_msg)
+            index = np.array(index)
+            x[index], y[index] = transformAPCoords(geometry, rawX[index], rawY[index])
+        return x.tolist(), y.tolist()
+
+    def __buildFloorMetadata(self):
+        # height, thickness, building and attenuation of every floor placed in a building, resolved with one join
+        import numpy as np
+        import pandas as pd
+        if not self.buildingexists:
+            return {}
+        buildingFloors = self.buildingFloors_df.drop_duplicates('floorPlanId')[['floorPlanId', 'buildingId', 'height', 'thickness', 'floorTypeId']]
+        floorTypes = self.floorTypes_df
+        if 'propagationProperties' in floorTypes:
+            attenuation = floorTypes['propagationProperties'].map(lambda p: p[0]['attenuationFactor'] if isinstance(p, list) and p else np.nan)
+        elif 'attenuationPerMeter' in floorTypes:
+            attenuation = floorTypes['attenuationPerMeter']
+        else:
+            attenuation = pd.Series(np.nan, index=floorTypes.index)
+        floorMetadata = buildingFloors.join(attenuation.rename('attenuation'), on='floorTypeId')
+        floorMetadata['attenuation'] = floorMetadata['attenuation'] * floorMetadata['thickness']
+        return floorMetadata.set_index('floorPlanId').to_dict('index')
+
     def __processEkahauData(self):
+        import pandas as pd
 
         self.EkahauData = {'building':[],'floors':[],'aps':[]}
 
@@ -246,32 +651,28 @@ class Ekahau:
                 for element in address_keys:
                     if element not in res:
                         res[element] = "Unknown"
-                data = {
-                    'building_id': building_id,
-                    'name': row['name'],
-                    'address': res,
-                    'xiq_building_id' : None
-                }
-                if data['address']['address'] == '':
-                    data['address']['address'] = 'Unknown'
-                self.EkahauData['building'].append(data)
+                if res['address'] == '':
+                    res['address'] = 'Unknown'
+                self.EkahauData['building'].append(Building(building_id, row['name'], res))
 
         # Floor data
-        for floor_id, row in self.floorPlans_df.iterrows():
+        with profiler.span('ekahau.floorMetadata'):
+            floorMetadata = self.__buildFloorMetadata()
+        try:
+            with profiler.span('ekahau.floorImages', floors=len(self.floorPlans_df.index), jobs=self.jobs):
+                floorImages = self.__processFloorImages(list(self.floorPlans_df.index))
+        except ValueError as e:
+            raise ValueError(e)
+        for (floor_id, row), (floorImageName, width, height) in zip(self.floorPlans_df.iterrows(), floorImages):
             # collect needed data
             self.metersPerUnit[floor_id] = row['metersPerUnit']
-            if self.buildingexists and floor_id in self.buildingFloors_df['floorPlanId'].unique():
-                filt = self.buildingFloors_df['floorPlanId'] == floor_id
-                floorHeight = self.buildingFloors_df.loc[filt, 'height'].values[0]
-                floorThickness = self.buildingFloors_df.loc[filt, 'thickness'].values[0]
-                floorTypeId = self.buildingFloors_df.loc[filt, 'floorTypeId'].values[0]
-                buildingId = self.buildingFloors_df.loc[filt, 'buildingId'].values[0]
-                typeFilt = self.floorTypes_df['id'] = floorTypeId
-                if 'propagationProperties' in self.floorTypes_df:
-                    propProperties = self.floorTypes_df.loc[typeFilt,'propagationProperties']
-                    floorAttenuation = propProperties[0]['attenuationFactor'] * floorThickness
-                elif 'attenuationPerMeter' in self.floorTypes_df:
-                    floorAttenuation = self.floorTypes_df.loc[typeFilt, 'attenuationPerMeter'] * floorThickness
+            if floor_id in floorMetadata:
+                metadata = floorMetadata[floor_id]
+                floorHeight = metadata['height']
+                buildingId = metadata['buildingId']
+                floorAttenuation = metadata['attenuation']
+                if pd.isna(floorAttenuation):
+                    floorAttenuation = 15
             else:
                 #TODO Figure out what to do about height - 
                 #TODO I could read in the simulatedRadios.json and find the 
@@ -279,53 +680,27 @@ class Ekahau:
                 floorHeight = 4
                 buildingId = None
                 floorAttenuation = 15
-            row.dropna(inplace=True)
-            # Change image names
-            if 'bitmapImageId' in row:
-                imageType = 'bitmap'
-                imageId = row['bitmapImageId']
-            else:
-                imageType = 'regular'
-                imageId = row['imageId']
-            try:
-                floorImageName, width, height = self.__floorImageProcessing(imageId, imageType)
-            except ValueError as e:
-                raise ValueError(e)
-
-            #Floor Payload
-            data = {
-                "floor_id" : floor_id, 
-                "associated_building_id" : buildingId,
-                 "name": row['name'],
-                 "environment": "AUTO_ESTIMATE",
-                 "db_attenuation": str(floorAttenuation),
-                 "measurement_unit": "METERS",
-                "installation_height": str(floorHeight),
-                "map_size_width": str(width),
-                "map_size_height": str(height),
-                "map_name": floorImageName,
-                "xiq_floor_id" : None
-            }
-            self.EkahauData['floors'].append(data)
+
+            self.EkahauData['floors'].append(Floor(floor_id, buildingId, row['name'],
+                                                   db_attenuation=str(floorAttenuation),
+                                                   installation_height=str(floorHeight),
+                                                   map_size_width=str(width),
+                                                   map_size_height=str(height),
+                                                   map_name=floorImageName))
             
-        for ap_id, row in self.ap_df.iterrows():
+        accessPoints = self.project.section('accessPoints')
+        names = [ap['name'] for ap in accessPoints]
+        locations = [ap['location'] for ap in accessPoints]
+        floorIds = [location['floorPlanId'] for location in locations]
+        with profiler.span('ekahau.apCoords', aps=len(floorIds)):
+            x, y = self.__updateAPCoords(floorIds,
+                                         [location['coord']['x'] for location in locations],
+                                         [location['coord']['y'] for location in locations])
+        for name, ap_floor_id, ap_x, ap_y in zip(names, floorIds, x, y):
             # collect needed data
-            if "::" in row['name']:
-                ap_name, ap_sn = [x.strip() for x in row['name'].split("::")]
+            if "::" in name:
+                ap_name, ap_sn = [x.strip() for x in name.split("::")]
             else:
-                ap_name = row['name']
+                ap_name = name
                 ap_sn = ''
-            ap_floor_id = (row['location']['floorPlanId'])
-            rawX = row['location']['coord']['x']
-            rawY = row['location']['coord']['y']
-            x,y = self.__updateAPCoord(ap_floor_id,rawX,rawY)
-            
-            data = {
-                'xiq_id': None,
-                'name' : ap_name,
-                'sn' : ap_sn,
-                'location_id' : ap_floor_id,
-                'x' : x,
-                'y' : y
-            }
-            self.EkahauData['aps'].append(data)
\ No newline at end of file
+            self.EkahauData['aps'].append(AccessPoint(ap_name, ap_sn, ap_floor_id, ap_x, ap_y))
\ No newline at end of file
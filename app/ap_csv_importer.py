@@ -1,55 +1,201 @@
 #!/usr/bin/env python3
+from collections import Counter
+from difflib import SequenceMatcher
 import logging
 import os
 import inspect
+import re
 import sys
-import pandas as pd
 current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 parent_dir = os.path.dirname(current_dir)
-sys.path.insert(0, parent_dir) 
+sys.path.insert(0, parent_dir)
 from mapImportLogger import logger
 
 logger = logging.getLogger('MapImporter.ap_csv_importer')
 
 PATH = current_dir
 
+# runs of whitespace and the separators used in AP names count as one separator in a normalized name
+SEPARATORS = r'[\s\-_.:/\\]+'
+
+def normalizeName(name):
+    """AP name compared without case, whitespace or separator differences, so 'AP-1-01' and 'ap 1 01' are the same"""
+    return re.sub(SEPARATORS, '-', name.lower()).strip('-')
+
+def nameTrigrams(key):
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def nameNumbers(key):
+    return tuple(int(number) for number in re.findall(r'\d+', key))
+
 class apSerialCSV:
+    matchModes = ['exact', 'normalized', 'fuzzy']
+
     def __init__(self,filename,ap_info):
         if os.path.exists(filename):
             self.filename = filename
-            self.ap_info = ap_info # import the ap dataframe created from EkahauData
+            self.ap_info = ap_info # the AccessPoint records of EkahauData
+            self.duplicates = {}
+            self.unmatchedCsvRows = 0
+            self.normalizedMatches = []
+            self.proposals = []
         else:
             log_msg = f"File {filename} does not exist."
             logger.error(log_msg)
             print("Failed")
             print(log_msg)
             raise SystemExit
-    
 
-    def getSerialNumbers(self):
-        ap_data = []
-        unmatched_ap_info_ap = []
+
+    def getSerialNumbers(self, chunkSize=50000, maxUnmatched=500, match='exact', fuzzyCutoff=0.8):
+        """Matches the APs to the AP Name/Serial Number rows of the CSV file, by exact, normalized or fuzzy name.
+
+        Returns the matched APs, the names of the APs not in the CSV and up to maxUnmatched CSV names matching no AP.
+        """
+        if match not in apSerialCSV.matchModes:
+            raise ValueError(f"Unknown match mode {match}, use one of {', '.join(apSerialCSV.matchModes)}")
+        apNames = {ap.name for ap in self.ap_info}
+        # normalized names of every AP, only used to keep the rows that may match one of them while reading
+        apKeys = {normalizeName(name) for name in apNames} if match != 'exact' else set()
+        self.duplicates = {}
+        self.unmatchedCsvRows = 0
+        self.normalizedMatches = []
+        self.proposals = []
+        serials = {}
+        normalizedRows = {}
         unmatched_csv_ap = []
+        reported = set()
+
+        def reportUnmatched(names):
+            for name in names:
+                if len(unmatched_csv_ap) >= maxUnmatched:
+                    break
+                if name not in reported:
+                    reported.add(name)
+                    unmatched_csv_ap.append(name)
+
+        for chunk in self.__readChunks(chunkSize):
+            names = chunk['AP Name']
+            known = names.isin(apNames)
+            for name, serial in zip(names[known], chunk['Serial Number'][known]):
+                serial = serial if isinstance(serial, str) else ''
+                if name in serials:
+                    self.duplicates.setdefault(name, [serials[name]]).append(serial)
+                else:
+                    serials[name] = serial
+            unknown = names[~known].dropna()
+            unknown = unknown[unknown.str.strip() != '']
+            if apKeys:
+                keys = self.__normalizeSeries(unknown)
+                knownKey = keys.isin(apKeys)
+                matchedKeys = keys[knownKey]
+                for name, key, serial in zip(unknown[knownKey], matchedKeys, chunk['Serial Number'].loc[matchedKeys.index]):
+                    normalizedRows.setdefault(key, []).append((name, serial if isinstance(serial, str) else ''))
+                unknown = unknown[~knownKey]
+            self.unmatchedCsvRows += len(unknown)
+            reportUnmatched(unknown.unique())
+
+        # rows are only matched by their normalized name to APs without an exact match
+        normalizedIndex = {}
+        if apKeys:
+            for name in apNames - serials.keys():
+                normalizedIndex.setdefault(normalizeName(name), []).append(name)
+        normalizedSerials = {}
+        for key, rows in normalizedRows.items():
+            candidates = normalizedIndex.get(key, [])
+            if len(candidates) == 1:
+                normalizedSerials[key] = rows[0]
+                if len(rows) > 1:
+                    self.duplicates.setdefault(rows[0][0], [rows[0][1]]).extend(serial for _, serial in rows[1:])
+                continue
+            if candidates:
+                logger.warning(f"{rows[0][0]} in {self.filename} matches {', '.join(candidates)} once normalized so it was not used")
+            self.unmatchedCsvRows += len(rows)
+            reportUnmatched(name for name, _ in rows)
+        for name, repeated in self.duplicates.items():
+            if len(set(repeated)) > 1:
+                logger.warning(f"{name} is in {self.filename} {len(repeated)} times with different serial numbers, {repeated[0] or 'no serial number'} from its first row is used")
+            else:
+                logger.info(f"{name} is in {self.filename} {len(repeated)} times")
+
+        ap_data = []
+        unmatched_aps = []
+        for ap in self.ap_info:
+            if ap.name in serials:
+                ap.sn = serials[ap.name]
+                ap_data.append(ap)
+                continue
+            key = normalizeName(ap.name) if normalizedSerials else None
+            if key in normalizedSerials:
+                csvName, ap.sn = normalizedSerials[key]
+                ap_data.append(ap)
+                self.normalizedMatches.append((ap.name, csvName))
+                logger.info(f"{ap.name} was matched to {csvName} in {self.filename}")
+                continue
+            unmatched_aps.append(ap)
+        if match == 'fuzzy' and unmatched_aps:
+            self.proposals = self.__proposeMatches(unmatched_aps, apNames, apKeys, chunkSize, fuzzyCutoff)
+        for ap in unmatched_aps:
+            logger.info(f"{ap.name} was not found in {self.filename}")
+        if self.unmatchedCsvRows:
+            logger.info(f"{self.unmatchedCsvRows} rows of {self.filename} didn't match the name of any known AP: " + ",".join(unmatched_csv_ap))
+        return ap_data, [ap.name for ap in unmatched_aps], unmatched_csv_ap
+
+    def __readChunks(self, chunkSize):
+        import pandas as pd
         try:
-            csv_df = pd.read_csv(self.filename,dtype=str)
-        except:
+            for chunk in pd.read_csv(self.filename, usecols=['AP Name', 'Serial Number'], dtype=str, chunksize=chunkSize):
+                yield chunk
+        except (OSError, ValueError) as e:
             log_msg = f"Unable to load csv file {self.filename}"
-            logger.error(log_msg)
+            logger.error(f"{log_msg}: {e}")
             raise ValueError(log_msg)
-        for ap in self.ap_info:
-            if ap['name'] in csv_df['AP Name'].values:
-                filt = csv_df['AP Name'] == ap['name']
-                ap['sn'] = (csv_df.loc[filt, 'Serial Number'].values[0])
-            else:
-                unmatched_ap_info_ap.append(ap['name'])
-                log_msg = (f"{ap['name']} was not found in {self.filename}")
-                logger.info(log_msg)
+
+    def __normalizeSeries(self, names):
+        # same as normalizeName, for a whole chunk at once
+        return names.str.lower().str.replace(SEPARATORS, '-', regex=True).str.strip('-')
+
+    def __proposeMatches(self, aps, apNames, apKeys, chunkSize, cutoff, maxCandidates=5):
+        """Proposes the most similar unmatched CSV row for each of aps, scoring each row against the APs sharing the most trigrams"""
+        keys = [normalizeName(ap.name) for ap in aps]
+        numbers = [nameNumbers(key) for key in keys]
+        index = {}
+        for position, key in enumerate(keys):
+            for gram in nameTrigrams(key):
+                index.setdefault(gram, []).append(position)
+        # trigrams shared by too many APs do not tell them apart and are left out
+        maxPosting = max(20, len(aps) // 20)
+        best = {}
+        for chunk in self.__readChunks(chunkSize):
+            names = chunk['AP Name']
+            rows = names.notna() & ~names.isin(apNames)
+            rowKeys = self.__normalizeSeries(names[rows])
+            if apKeys:
+                unknown = ~rowKeys.isin(apKeys)
+                rowKeys = rowKeys[unknown]
+            for name, key, serial in zip(names.loc[rowKeys.index], rowKeys, chunk['Serial Number'].loc[rowKeys.index]):
+                if not key:
+                    continue
+                shared = Counter()
+                for gram in nameTrigrams(key):
+                    posting = index.get(gram)
+                    if posting and len(posting) <= maxPosting:
+                        shared.update(posting)
+                keyNumbers = nameNumbers(key)
+                for position, _ in shared.most_common(maxCandidates):
+                    # 'AP 12' is never proposed for 'AP 13', however similar the names are
+                    if numbers[position] != keyNumbers:
+                        continue
+                    score = SequenceMatcher(None, key, keys[position]).ratio()
+                    if score >= cutoff and score > best.get(position, (None, None, 0))[2]:
+                        best[position] = (name, serial if isinstance(serial, str) else '', score)
+        proposals = []
+        proposed = set()
+        for position, (name, serial, score) in sorted(best.items(), key=lambda item: item[1][2], reverse=True):
+            if name in proposed:
                 continue
-            ap_data.append(ap)
-        for ap in csv_df['AP Name']:
-            if not any(d['name'] == ap for d in self.ap_info):
-                unmatched_csv_ap.append(ap)
-                log_msg = (f"{ap} was found in {self.filename} but didn't match name of any known AP")
-                logger.info(log_msg)
-        
-        return ap_data, unmatched_ap_info_ap, unmatched_csv_ap
\ No newline at end of file
+            proposed.add(name)
+            proposals.append((aps[position], name, serial, score))
+            logger.info(f"{name} in {self.filename} was proposed for {aps[position].name} with a similarity of {score:.2f}")
+        return sorted(proposals, key=lambda proposal: proposal[0].name)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import hashlib
+import logging
+import os
+import inspect
+import sys
+import threading
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+from mapImportLogger import logger
+
+logger = logging.getLogger('MapImporter.image_cache')
+
+PATH = current_dir
+
+class ImageCache:
+    """Persistent cache of processed floor images keyed by source bytes and settings, with LRU eviction past maxBytes"""
+    def __init__(self, directory, maxBytes=500*1000*1000):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            log_msg = f"Unable to create image cache directory {directory}: {e}"
+            logger.error(log_msg)
+            raise ValueError(log_msg)
+
+    def key(self, source, *settings):
+        digest = hashlib.blake2b(source, digest_size=20)
+        digest.update(repr(settings).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        filename = os.path.join(self.directory, f"{key}.jpg")
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            # the mtime is when the entry was last used, eviction goes by it
+            os.utime(filename)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.info(f"Image cache hit {key}")
+        return data
+
+    def put(self, key, data):
+        filename = os.path.join(self.directory, f"{key}.jpg")
+        tempname = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tempname, 'wb') as f:
+                f.write(data)
+            os.replace(tempname, filename)
+        except OSError as e:
+            logger.warning(f"Unable to write {key} to the image cache: {e}")
+            return
+        self.__evict()
+
+    def __evict(self):
+        with self.__lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.jpg'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.maxBytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                logger.info(f"Evicted {os.path.basename(path)} from the image cache")
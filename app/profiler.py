@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import inspect
+import sys
+import threading
+import time
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+from mapImportLogger import logger
+
+logger = logging.getLogger('MapImporter.profiler')
+
+PATH = current_dir
+
+class Profiler:
+    """Records the wall and thread CPU time of spans of the import phases and API calls once enable() was called"""
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.__lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        self.spans = []
+        self.startTime = datetime.now(timezone.utc)
+        self.__start = time.perf_counter()
+        self.__cpuStart = time.process_time()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Times the with block as name. The attributes dict is yielded so the block can add to it."""
+        if not self.enabled:
+            yield attributes
+            return
+        start = time.perf_counter()
+        # thread CPU time, so spans of the floor image and batch worker threads add up
+        cpuStart = time.thread_time()
+        try:
+            yield attributes
+        finally:
+            record = {
+                'name': name,
+                'thread': threading.current_thread().name,
+                'start': start - self.__start,
+                'wall': time.perf_counter() - start,
+                'cpu': time.thread_time() - cpuStart
+            }
+            record.update(attributes)
+            with self.__lock:
+                self.spans.append(record)
+
+    def report(self):
+        totals = {}
+        for record in self.spans:
+            total = totals.setdefault(record['name'], {'count': 0, 'wall': 0.0, 'cpu': 0.0})
+            total['count'] += 1
+            total['wall'] += record['wall']
+            total['cpu'] += record['cpu']
+        return {
+            'started': self.startTime.isoformat(),
+            'wall': time.perf_counter() - self.__start,
+            'cpu': time.process_time() - self.__cpuStart,
+            'totals': dict(sorted(totals.items(), key=lambda item: item[1]['wall'], reverse=True)),
+            'spans': sorted(self.spans, key=lambda record: record['start'])
+        }
+
+    def write(self, filename):
+        try:
+            with open(filename, 'w') as f:
+                json.dump(self.report(), f, indent=2, default=str)
+        except OSError as e:
+            log_msg = f"Unable to write the profile report {filename}: {e}"
+            logger.error(log_msg)
+            raise ValueError(log_msg)
+        logger.info(f"Profile report written to {filename}")
+
+# shared by the importer, the XIQ client and the main script
+profiler = Profiler()
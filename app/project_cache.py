@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import hashlib
+import logging
+import os
+import inspect
+import pickle
+import sys
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+from mapImportLogger import logger
+
+logger = logging.getLogger('MapImporter.project_cache')
+
+PATH = current_dir
+
+class ProjectCache:
+    """Persistent cache of the EkahauData and image cache keys of .esx files, keyed by content hash and settings"""
+    version = 3
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.indexDirectory = os.path.join(directory, 'index')
+        try:
+            os.makedirs(self.indexDirectory, exist_ok=True)
+        except OSError as e:
+            log_msg = f"Unable to create project cache directory {directory}: {e}"
+            logger.error(log_msg)
+            raise ValueError(log_msg)
+
+    def __contentHash(self, filename):
+        # the index maps path, size and mtime to the content hash, so only a new, touched or copied file is read
+        stat = os.stat(filename)
+        fingerprint = f"{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}"
+        indexfile = os.path.join(self.indexDirectory, hashlib.blake2b(fingerprint.encode(), digest_size=20).hexdigest())
+        try:
+            with open(indexfile, 'r') as f:
+                return f.read().strip()
+        except OSError:
+            pass
+        digest = hashlib.blake2b(digest_size=20)
+        with open(filename, 'rb') as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+        contentHash = digest.hexdigest()
+        try:
+            with open(indexfile, 'w') as f:
+                f.write(contentHash)
+        except OSError as e:
+            logger.warning(f"Unable to write project cache index for {filename}: {e}")
+        return contentHash
+
+    def __entryFile(self, filename, settings):
+        settingsHash = hashlib.blake2b(repr((ProjectCache.version, settings)).encode(), digest_size=8).hexdigest()
+        return os.path.join(self.directory, f"{self.__contentHash(filename)}-{settingsHash}.pickle")
+
+    def get(self, filename, *settings):
+        try:
+            entryfile = self.__entryFile(filename, settings)
+            with open(entryfile, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        logger.info(f"Project cache hit for {filename}")
+        return entry['EkahauData'], entry['imageKeys']
+
+    def put(self, filename, ekahauData, imageKeys, *settings):
+        try:
+            entryfile = self.__entryFile(filename, settings)
+            tempname = f"{entryfile}.{os.getpid()}.tmp"
+            with open(tempname, 'wb') as f:
+                pickle.dump({'EkahauData': ekahauData, 'imageKeys': imageKeys}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tempname, entryfile)
+        except OSError as e:
+            logger.warning(f"Unable to write {filename} to the project cache: {e}")
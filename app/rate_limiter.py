@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import inspect
+import sys
+import threading
+import time
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+from mapImportLogger import logger
+
+logger = logging.getLogger('MapImporter.rate_limiter')
+
+PATH = current_dir
+
+if os.name == 'nt':
+    import msvcrt
+
+    def lockBucket(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def unlockBucket(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def lockBucket(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def unlockBucket(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class RateLimiter:
+    """Token bucket limiting XIQ calls to rate per second in bursts of up to burst, shared through lockFile by the imports using it"""
+    def __init__(self, rate, burst=None, lockFile=None):
+        if rate <= 0:
+            raise ValueError("The rate limit must be greater than 0")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        if self.burst < 1:
+            raise ValueError("The rate limit burst must be 1 or greater")
+        self.lockFile = lockFile
+        self.calls = 0
+        self.delayed = 0
+        self.waited = 0.0
+        self.__lock = threading.Lock()
+        self.__tokens = self.burst
+        self.__updated = time.monotonic()
+        if lockFile:
+            try:
+                open(lockFile, 'a').close()
+            except OSError as e:
+                log_msg = f"Unable to open the rate limit lock file {lockFile}: {e}"
+                logger.error(log_msg)
+                raise ValueError(log_msg)
+
+    def __take(self, tokens, updated, now):
+        # the bucket may go below 0, each missing token is a wait of 1 / rate secs, so waiting callers are served in order
+        tokens = min(self.burst, tokens + (now - updated) * self.rate) - 1
+        return tokens, now, max(0.0, -tokens / self.rate)
+
+    def __takeShared(self):
+        with open(self.lockFile, 'r+') as f:
+            lockBucket(f)
+            try:
+                # processes do not share a monotonic clock, the wall clock is used for the shared bucket
+                now = time.time()
+                try:
+                    state = json.loads(f.read())
+                    tokens, updated = float(state['tokens']), float(state['updated'])
+                except (ValueError, KeyError, TypeError):
+                    tokens, updated = self.burst, now
+                # if the wall clock was stepped back, the bucket continues from now instead of losing tokens
+                tokens, updated, wait = self.__take(tokens, min(updated, now), now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'tokens': tokens, 'updated': updated}))
+                f.flush()
+            finally:
+                unlockBucket(f)
+        return wait
+
+    def acquire(self):
+        """Takes a token, sleeping until it is available. Returns the seconds waited."""
+        with self.__lock:
+            wait = None
+            if self.lockFile:
+                try:
+                    wait = self.__takeShared()
+                except OSError as e:
+                    logger.warning(f"Unable to use the rate limit lock file {self.lockFile}, limiting this import only: {e}")
+                    self.lockFile = None
+            if wait is None:
+                self.__tokens, self.__updated, wait = self.__take(self.__tokens, self.__updated, time.monotonic())
+            self.calls += 1
+            if wait > 0:
+                self.delayed += 1
+                self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
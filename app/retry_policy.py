@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import logging
+import os
+import inspect
+import random
+import sys
+import threading
+import time
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+from mapImportLogger import logger
+from app.profiler import profiler
+
+logger = logging.getLogger('MapImporter.retry_policy')
+
+PATH = current_dir
+
+# XIQ answers with these while it is throttling or overloaded, the request was not processed
+THROTTLED = (429, 503)
+
+class APIError(ValueError):
+    """A failed XIQ call. status is None if no response was received, sent is False if the request never reached XIQ."""
+    def __init__(self, message, status=None, retryAfter=None, sent=True):
+        super().__init__(message)
+        self.status = status
+        self.retryAfter = retryAfter
+        self.sent = sent
+
+def retryAfter(response):
+    """Seconds to wait asked for by the Retry-After header of response, in seconds or as an HTTP date. None if there is none."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """Retries one type of XIQ call with backoff, jitter and Retry-After, within a retry budget shared by its calls"""
+    def __init__(self, attempts=5, baseDelay=1.0, maxDelay=30.0, maxRetryAfter=120.0, maxThrottleWait=600.0, budget=None,
+                 budgetRefill=0.1):
+        self.attempts = attempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.maxRetryAfter = maxRetryAfter
+        self.maxThrottleWait = maxThrottleWait
+        self.budget = budget
+        self.maxBudget = budget
+        self.budgetRefill = budgetRefill
+        self.__lock = threading.Lock()
+
+    def retryable(self, error, idempotent):
+        if error.status in THROTTLED or not error.sent:
+            return True
+        if not idempotent:
+            return False
+        return error.status is None or not 400 <= error.status < 500 or error.status == 408
+
+    def delay(self, tries, retryAfter=None):
+        """Wait before the retry following tries failed tries"""
+        delay = random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** (tries - 1)))
+        if retryAfter is not None:
+            delay = max(delay, min(retryAfter, self.maxRetryAfter))
+        return delay
+
+    def __takeBudget(self):
+        with self.__lock:
+            if self.budget is None:
+                return True
+            if self.budget < 1:
+                return False
+            self.budget -= 1
+            return True
+
+    def __refillBudget(self):
+        if self.budget is None or self.budget >= self.maxBudget:
+            return
+        with self.__lock:
+            # rounded so that refills adding up to a whole retry give one, 10 * 0.1 is just below 1 as a float
+            self.budget = min(self.maxBudget, round(self.budget + self.budgetRefill, 9))
+
+    def call(self, info, function, idempotent=True):
+        """Returns function(), retrying it on APIError as the policy allows. The last APIError is raised once it gives up."""
+        attempt = 1
+        tries = 0
+        throttleWait = 0.0
+        while True:
+            try:
+                result = function()
+            except APIError as e:
+                error = e
+            else:
+                self.__refillBudget()
+                return result
+            tries += 1
+            if not self.retryable(error, idempotent):
+                raise error
+            delay = self.delay(tries, error.retryAfter)
+            # throttled calls slow down without using attempts until maxThrottleWait secs were spent waiting on them
+            if error.status in THROTTLED and throttleWait + delay <= self.maxThrottleWait:
+                throttleWait += delay
+                log_msg = f"API to {info} was throttled by XIQ with {error}, trying again in {delay:.1f} secs"
+            else:
+                if attempt >= self.attempts:
+                    raise error
+                if not self.__takeBudget():
+                    logger.error(f"API to {info} failed with {error}, no retries are left for this type of call")
+                    raise error
+                log_msg = f"API to {info} failed attempt {attempt} of {self.attempts} with {error}, trying again in {delay:.1f} secs"
+                attempt += 1
+            logger.warning(log_msg)
+            print(log_msg)
+            with profiler.span('xiq.retryWait', status=error.status, delay=delay):
+                time.sleep(delay)
@@ -3,33 +3,64 @@ import logging
 import os
 import inspect
 import sys
+import asyncio
+import functools
 import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir) 
-from requests.exceptions import HTTPError
 from mapImportLogger import logger
+from app.profiler import profiler
+from app.retry_policy import APIError, RetryPolicy, retryAfter
 
 logger = logging.getLogger('MapImporter.xiq_exporter')
 
 PATH = current_dir
 
+# numeric ids and hex ids or UUIDs, such as those of long running operations, holding at least one digit
+PATH_ID = re.compile(r'/(?:\d+|(?=[^/]*\d)[0-9a-fA-F-]{8,})(?=/|$)')
+
+def profilePath(url):
+    """Path of url with its ids grouped as {id}, so every call to the same endpoint is timed under one span name"""
+    return PATH_ID.sub('/{id}', urlsplit(url).path)
+
 class XIQ:
-    def __init__(self, user_name, password):
-        self.URL = "https://api.extremecloudiq.com"
+    def __init__(self, user_name, password, poolSize=10, rateLimiter=None, url="https://api.extremecloudiq.com"):
+        self.URL = url.rstrip('/')
+        # an app.rate_limiter RateLimiter every call waits for, None to not limit the calls
+        self.rateLimiter = rateLimiter
         self.headers = {"Accept": "application/json", "Content-Type": "application/json"}
         self.totalretries = 5
-        self.locationTree_df = pd.DataFrame(columns = ['id', 'name', 'type', 'parent'])
+        # a policy for each type of call, budget is the number of failed calls of that type retried before giving up on retrying,
+        # successful calls of that type refill it
+        self.retryPolicies = {
+            'login': RetryPolicy(attempts=self.totalretries),
+            'get': RetryPolicy(attempts=self.totalretries, budget=50),
+            'post': RetryPolicy(attempts=self.totalretries, budget=20),
+            'put': RetryPolicy(attempts=self.totalretries, budget=20),
+            'upload': RetryPolicy(attempts=self.totalretries, budget=20),
+            'onboard': RetryPolicy(attempts=self.totalretries, baseDelay=5.0, maxDelay=60.0, budget=5)
+        }
+        self.locationTree_df = None
+        # one keep-alive connection pool for every thread, at most poolSize connections are open to XIQ
+        self.__adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize, pool_block=True)
+        self.__local = threading.local()
+        self.__sessions = []
+        self.__sessionsLock = threading.Lock()
         try:
             self.__getAccessToken(user_name, password)
         except ValueError as e:
             print(e)
             raise SystemExit
-        except HTTPError as e:
-           print(e)
-           raise SystemExit
+        except SystemExit:
+            raise
         except:
             log_msg = "Unknown Error: Failed to generate token for XIQ"
             logger.error(log_msg)
@@ -37,26 +68,62 @@ class XIQ:
             raise SystemExit 
 
     #API CALLS
-    def __setup_get_api_call(self, info, url):
-        success = 0
-        for count in range(1, self.totalretries):
+    def __session(self):
+        # a Session is not safe to share between threads, so each thread gets its own on top of the shared pool
+        session = getattr(self.__local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self.__adapter)
+            session.mount('http://', self.__adapter)
+            self.__local.session = session
+            with self.__sessionsLock:
+                self.__sessions.append(session)
+        return session
+
+    def close(self):
+        with self.__sessionsLock:
+            for session in self.__sessions:
+                session.close()
+            self.__sessions = []
+        self.__adapter.close()
+
+    def __request(self, method, url, **kwargs):
+        # every call to XIQ goes through here so it is timed with --profile
+        path = profilePath(url)
+        if self.rateLimiter:
+            with profiler.span('xiq.rateWait') as attributes:
+                attributes['waited'] = self.rateLimiter.acquire()
+        with profiler.span(f"xiq.{method.upper()} {path}") as attributes:
             try:
-                response = self.__get_api_call(url=url)
-            except ValueError as e:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with {e}")
-            except Exception as e:
-                print(f"API to {info} failed with {e}")
-                print('script is exiting...')
-                raise SystemExit
-            except:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with unknown API error")
-            else:
-                success = 1
-                break
-        if success != 1:
+                response = self.__session().request(method.upper(), url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"{type(e).__name__} on API {url}: {e}")
+                attributes['status'] = None
+                raise APIError(f"{type(e).__name__}: {e}", sent=self.__wasSent(e))
+            attributes['status'] = response.status_code
+        return response
+
+    @staticmethod
+    def __wasSent(error):
+        # only a connection that could not be opened guarantees XIQ never saw the request
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return False
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return not isinstance(reason, NewConnectionError)
+
+    def __retry(self, info, callType, function, *args, idempotent=True):
+        # makes the call with the retry policy of its type, the script can't continue once it gave up
+        try:
+            return self.retryPolicies[callType].call(info, lambda: function(*args), idempotent=idempotent)
+        except APIError as e:
+            logger.error(f"API to {info} failed with {e}")
+            print(f"API to {info} failed with {e}")
             print("failed to {}. Cannot continue to import".format(info))
             print("exiting script...")
             raise SystemExit
+
+    def __setup_get_api_call(self, info, url):
+        response = self.__retry(info, 'get', self.__get_api_call, url)
         if 'error' in response:
             if response['error_message']:
                 log_msg = (f"Status Code {response['error_id']}: {response['error_message']}")
@@ -67,25 +134,8 @@ class XIQ:
         return response
         
     def __setup_post_api_call(self, info, url, payload):
-        success = 0
-        for count in range(1, self.totalretries):
-            try:
-                response = self.__post_api_call(url=url, payload=payload)
-            except ValueError as e:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with {e}")
-            except Exception as e:
-                print(f"API to {info} failed with {e}")
-                print('script is exiting...')
-                raise SystemExit
-            except:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with unknown API error")
-            else:
-                success = 1
-                break
-        if success != 1:
-            print("failed {}. Cannot continue to import".format(info))
-            print("exiting script...")
-            raise SystemExit
+        # the posts made here create locations, sending one again could create them twice
+        response = self.__retry(info, 'post', self.__post_api_call, url, payload, idempotent=False)
         if 'error' in response:
             if response['error_message']:
                 log_msg = (f"Status Code {response['error_id']}: {response['error_message']}")
@@ -96,198 +146,74 @@ class XIQ:
         return response
     
     def __setup_put_api_call(self, info, url, payload=''):
-        success = 0
-        for count in range(1, self.totalretries):
-            try:
-                if payload:
-                    self.__put_api_call(url=url, payload=payload)
-                else:
-                    self.__put_api_call(url=url)
-            except ValueError as e:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with {e}")
-            except Exception as e:
-                print(f"API to {info} failed with {e}")
-                print('script is exiting...')
-                raise SystemExit
-            except:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with unknown API error")
-            else:
-                success = 1
-                break
-        if success != 1:
-            print("failed to {}. Cannot continue to import".format(info))
-            print("exiting script...")
-            raise SystemExit
-        
+        self.__retry(info, 'put', self.__put_api_call, url, payload)
         return 'Success'
 
-    def __setup_lro_api_call(self, info, url, payload, lro):
-        url = url + str(lro)
-        for count in range(1, self.totalretries):
-            try:
-                response = requests.post(url, headers= self.headers, data=payload)
-            except HTTPError as http_err:
-                logger.error(f'HTTP error occurred: {http_err} - on API {url}')
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with HTTP error occurred: {http_err}")
-                continue
-            if response is None:
-                log_msg = "ERROR: No response received from XIQ!"
-                logger.error(log_msg)
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with {log_msg}")
-                continue
-            if lro:
-                if response.status_code != 202:
-                    log_msg = f"Error - HTTP Status Code: {str(response.status_code)}"
-                    logger.error(f"{log_msg}")
-                    logger.warning(f"\t\t{response.text()}")
-                    print(f"API to {info} failed attempt {count} of {self.totalretries} with {log_msg}")
-                    continue
-                return response
-            else:
-                if response.status_code != 200:
-                    log_msg = f"Error - HTTP Status Code: {str(response.status_code)}"
-                    logger.error(f"{log_msg}")
-                    logger.warning(f"\t\t{response.text()}")
-                    print(f"API to {info} failed attempt {count} of {self.totalretries} with {log_msg}")
-                    continue
-                try:
-                    data = response.json()
-                except json.JSONDecodeError:
-                    logger.error(f"Unable to parse json data - {url} - HTTP Status Code: {str(response.status_code)}")
-                    print(f"API to {info} failed attempt {count} of {self.totalretries} with Unable to parse the data from json, script cannot proceed")
-                return data
-
+    def __lro_api_call(self, url, payload, lro):
+        response = self.__request('post', url, headers= self.headers, data=payload)
+        if lro:
+            if response.status_code != 202:
+                raise self.__apiError(response, url)
+            return response
+        return self.__responseData(response, url)
 
-    def __get_api_call(self, url):
+    def __apiError(self, response, url):
+        log_msg = f"Error - HTTP Status Code: {str(response.status_code)}"
+        logger.error(f"{log_msg} - on API {url}")
         try:
-            response = requests.get(url, headers= self.headers)
-        except HTTPError as http_err:
-            logger.error(f'HTTP error occurred: {http_err} - on API {url}')
-            raise ValueError(f'HTTP error occurred: {http_err}') 
-        if response is None:
-            log_msg = "ERROR: No response received from XIQ!"
-            logger.error(log_msg)
-            raise ValueError(log_msg)
+            data = response.json()
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and data.get('error_message'):
+            logger.warning(f"\t\t{data['error_message']}")
+            log_msg = f"{log_msg} - {data['error_message']}"
+        else:
+            logger.warning(f"\t\t{response.text}")
+        return APIError(log_msg, status=response.status_code, retryAfter=retryAfter(response))
+
+    def __responseData(self, response, url):
         if response.status_code != 200:
-            log_msg = f"Error - HTTP Status Code: {str(response.status_code)}"
-            logger.error(f"{log_msg}")
-            logger.warning(f"\t\t{response.text()}")
-            raise ValueError(log_msg)  
+            raise self.__apiError(response, url)
         try:
             data = response.json()
-        except json.JSONDecodeError:
+        except ValueError:
             logger.error(f"Unable to parse json data - {url} - HTTP Status Code: {str(response.status_code)}")
-            raise ValueError("Unable to parse the data from json, script cannot proceed")
+            raise APIError("Unable to parse the data from json, script cannot proceed", status=response.status_code)
         return data
 
+    def __get_api_call(self, url):
+        response = self.__request('get', url, headers= self.headers)
+        return self.__responseData(response, url)
+
     def __post_api_call(self, url, payload):
-        try:
-            response = requests.post(url, headers= self.headers, data=payload)
-        except HTTPError as http_err:
-            logger.error(f'HTTP error occurred: {http_err} - on API {url}')
-            raise ValueError(f'HTTP error occurred: {http_err}') 
-        if response is None:
-            log_msg = "ERROR: No response received from XIQ!"
-            logger.error(log_msg)
-            raise ValueError(log_msg)
+        response = self.__request('post', url, headers= self.headers, data=payload)
         if response.status_code == 202:
             return "Success"
-        elif response.status_code != 200:
-            log_msg = f"Error - HTTP Status Code: {str(response.status_code)}"
-            logger.error(f"{log_msg}")
-            try:
-                data = response.json()
-            except json.JSONDecodeError:
-                logger.warning(f"\t\t{response.text()}")
-            else:
-                if 'error_message' in data:
-                    logger.warning(f"\t\t{data['error_message']}")
-                    raise Exception(data['error_message'])
-            raise ValueError(log_msg)
-        try:
-            data = response.json()
-        except json.JSONDecodeError:
-            logger.error(f"Unable to parse json data - {url} - HTTP Status Code: {str(response.status_code)}")
-            raise ValueError("Unable to parse the data from json, script cannot proceed")
-        return data
+        return self.__responseData(response, url)
     
     def __put_api_call(self, url, payload=''):
-        try:
-            if payload:
-                response = requests.put(url, headers= self.headers, data=payload)
-            else:
-                response = requests.put(url, headers= self.headers)
-        except HTTPError as http_err:
-            logger.error(f'HTTP error occurred: {http_err} - on API {url}')
-            raise ValueError(f'HTTP error occurred: {http_err}') 
-        if response is None:
-            log_msg = "ERROR: No response received from XIQ!"
-            logger.error(log_msg)
-            raise ValueError(log_msg)
+        if payload:
+            response = self.__request('put', url, headers= self.headers, data=payload)
+        else:
+            response = self.__request('put', url, headers= self.headers)
         if response.status_code != 200:
-            log_msg = f"Error - HTTP Status Code: {str(response.status_code)}"
-            logger.error(f"{log_msg}")
-            logger.warning(f"\t\t{response}")
-            try:
-                data = response.json()
-            except json.JSONDecodeError:
-                logger.warning(f"\t\t{response.text()}")
-            else:
-                if 'error_message' in data:
-                    logger.warning(f"\t\t{data['error_message']}")
-                    raise Exception(data['error_message'])
-                raise ValueError(log_msg)
+            raise self.__apiError(response, url)
         return response.status_code
 
     def __image_api_call(self, url, files):
         headers = self.headers.copy()
         del headers['Content-Type']
-        try:
-            response = requests.post(url, headers= headers, files=files)
-        except HTTPError as http_err:
-            logger.error(f'HTTP error occurred: {http_err} - on API {url}')
-            raise ValueError(f'HTTP error occurred: {http_err}') 
-        if response is None:
-            log_msg = "ERROR: No response received from XIQ!"
-            logger.error(log_msg)
-            raise ValueError(log_msg)
+        response = self.__request('post', url, headers= headers, files=files)
         if response.status_code != 200:
-            log_msg = f"Error - HTTP Status Code: {str(response.status_code)}"
-            logger.error(f"{log_msg}")
-            try:
-                data = response.json()
-            except json.JSONDecodeError:
-                logger.warning(f"\t\t{response.text()}")
-            else:
-                if 'error_message' in data:
-                    logger.warning(f"\t\t{data['error_message']}")
-                    raise Exception(data['error_message'])
-            raise ValueError(log_msg)
+            raise self.__apiError(response, url)
         return 1
 
     def __getAccessToken(self, user_name, password):
         info = "get XIQ token"
-        success = 0
         url = self.URL + "/login"
         payload = json.dumps({"username": user_name, "password": password})
-        for count in range(1, self.totalretries):
-            try:
-                data = self.__post_api_call(url=url,payload=payload)
-            except ValueError as e:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with {e}")
-            except Exception as e:
-                print(f"API to {info} failed with {e}")
-                print('script is exiting...')
-                raise SystemExit
-            except:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with unknown API error")
-            else:
-                success = 1
-                break
-        if success != 1:
-            print("failed to get XIQ token. Cannot continue to import")
-            print("exiting script...")
-            raise SystemExit
+        # logging in again only issues another token
+        data = self.__retry(info, 'login', self.__post_api_call, url, payload)
         
         if "access_token" in data:
             #print("Logged in and Got access token: " + data["access_token"])
@@ -302,20 +228,11 @@ class XIQ:
     # EXTERNAL ACCOUNTS
     def __getVIQInfo(self):
         info="get current VIQ name"
-        success = 0
         url = "{}/account/home".format(self.URL)
-        for count in range(1, self.totalretries):
-            try:
-                data = self.__get_api_call(url=url)
-            except ValueError as e:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with {e}")
-            except:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with unknown API error")
-            else:
-                success = 1
-                break
-        if success != 1:
-            print(f"Failed to {info}")
+        try:
+            data = self.retryPolicies['get'].call(info, lambda: self.__get_api_call(url=url))
+        except APIError as e:
+            print(f"Failed to {info} with {e}")
             return 1
             
         else:
@@ -325,6 +242,7 @@ class XIQ:
 
     #BUILDINGS
     def __buildLocationDf(self, location, pname = 'Global'):
+        import pandas as pd
         if 'parent_id' not in location:
             temp_df = pd.DataFrame([{'id': location['id'], 'name':location['name'], 'type': 'Global', 'parent':pname}])
             self.locationTree_df = pd.concat([self.locationTree_df, temp_df], ignore_index=True)
@@ -344,20 +262,11 @@ class XIQ:
     def selectManagedAccount(self):
         self.__getVIQInfo()
         info="gather accessible external XIQ acccounts"
-        success = 0
         url = "{}/account/external".format(self.URL)
-        for count in range(1, self.totalretries):
-            try:
-                data = self.__get_api_call(url=url)
-            except ValueError as e:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with {e}")
-            except:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with unknown API error")
-            else:
-                success = 1
-                break
-        if success != 1:
-            print(f"Failed to {info}")
+        try:
+            data = self.retryPolicies['get'].call(info, lambda: self.__get_api_call(url=url))
+        except APIError as e:
+            print(f"Failed to {info} with {e}")
             return 1
             
         else:
@@ -366,27 +275,10 @@ class XIQ:
 
     def switchAccount(self, viqID, viqName):
         info=f"switch to external account {viqName}"
-        success = 0
         url = "{}/account/:switch?id={}".format(self.URL,viqID)
         payload = ''
-        for count in range(1, self.totalretries):
-            try:
-                data = self.__post_api_call(url=url, payload=payload)
-            except ValueError as e:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with {e}")
-            except Exception as e:
-                print(f"API to {info} failed with {e}")
-                print('script is exiting...')
-                raise SystemExit
-            except:
-                print(f"API to {info} failed attempt {count} of {self.totalretries} with unknown API error")
-            else:
-                success = 1
-                break
-        if success != 1:
-            print("failed to get XIQ token to {}. Cannot continue to import".format(info))
-            print("exiting script...")
-            raise SystemExit
+        # switching again to the same account only issues another token
+        data = self.__retry(info, 'login', self.__post_api_call, url, payload)
         
         if "access_token" in data:
             #print("Logged in and Got access token: " + data["access_token"])
@@ -407,6 +299,8 @@ class XIQ:
 
     # LOCATIONS
     def gatherLocations(self):
+        import pandas as pd
+        self.locationTree_df = pd.DataFrame(columns = ['id', 'name', 'type', 'parent'])
         info=f"gather location tree"
         url = "{}/locations/tree".format(self.URL)
         response = self.__setup_get_api_call(info,url)
@@ -457,35 +351,23 @@ class XIQ:
         return response['id']
 
     #FLOORS
-    def uploadFloorplan(self, filename, floorname):
+    def uploadFloorplan(self, filename, floorname, imageDir):
         info=f"upload file '{filename}'"
-        success = 0
         url = "{}/locations/floorplan".format(self.URL)
-        filepathname = PATH + f"/images/{filename}"
-        files={
-            'file' : (f'{filename}', open(filepathname, 'rb'), 'image/png'),
-            'type': 'image/png'
-        }
-        for count in range(1, self.totalretries):
-            try:
-                self.__image_api_call(url=url, files=files)
-            except ValueError as e:
-                print(f"\nAPI to {info} failed attempt {count} of {self.totalretries} with {e}")
-            except Exception as e:
-                print(f"\nAPI to {info} failed with {e}")
-                print('script is exiting...')
-                raise SystemExit
-            except:
-                print(f"\nAPI to {info} failed attempt {count} of {self.totalretries} with unknown API error")
-            else:
-                success = 1
-                break
-        if success != 1:
-            print("\nfailed to {}. Cannot continue to import".format(info))
-            print("exiting script...")
-            raise SystemExit
-        else:
-            logger.info(f"Successfully uploaded {filename} for {floorname}")
+        filepathname = os.path.join(imageDir, filename)
+
+        def upload():
+            # opened for every attempt, a failed attempt may have read part of the file
+            with open(filepathname, 'rb') as f:
+                files={
+                    'file' : (f'{filename}', f, 'image/png'),
+                    'type': 'image/png'
+                }
+                return self.__image_api_call(url=url, files=files)
+
+        # uploading the same file name again replaces the file
+        self.__retry(info, 'upload', upload)
+        logger.info(f"Successfully uploaded {filename} for {floorname}")
 
     def createFloor(self, data):
         info=f"create floor '{data['name']}'"
@@ -511,8 +393,9 @@ class XIQ:
     def advanceOnboardAPs(self, data, lro=False):
         info="onboard APs"
         payload = json.dumps(data)
-        url = f"{self.URL}/devices/:advanced-onboard?async="
-        response = self.__setup_lro_api_call(info,url,payload,lro)
+        url = f"{self.URL}/devices/:advanced-onboard?async={lro}"
+        # onboarding again would fail on the devices it already added
+        response = self.__retry(info, 'onboard', self.__lro_api_call, url, payload, lro, idempotent=False)
         if lro:
             return response.headers['Location']
         else:
@@ -521,7 +404,12 @@ class XIQ:
     # LRO
     def checkLRO(self, url):
         info='check lro status'
-        response = requests.get(url, headers=self.headers)
+        try:
+            response = self.__request('get', url, headers=self.headers)
+        except APIError as e:
+            # the status is checked again on the next poll
+            print(f"Error {info} - {e}")
+            return {"metadata": {"status": f"ERROR: {e}"}}
         if response.status_code != 200:
             print(f"Error {info} - HTTP Status Code: {str(response.status_code)}")
             print(response.text)
@@ -538,8 +426,37 @@ class XIQ:
                     print(f"API to {info} failed attempt with Unable to parse the data from json, script cannot proceed") 
                     data = {
                           "metadata": {
-                            "status": f"Json parse ERROR: {str(response.text())}",
+                            "status": f"Json parse ERROR: {str(response.text)}",
                           }
                         }       
         return data
 
+
+class AsyncXIQ:
+    """asyncio front end of a logged in XIQ client, running up to concurrency calls at once on its own threads until close()"""
+    def __init__(self, xiq, concurrency=4):
+        self.xiq = xiq
+        # a retry waiting out its backoff keeps its own worker instead of one of the default executor of the loop
+        self.__executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='xiq')
+
+    async def __call(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, functools.partial(function, *args, **kwargs))
+
+    def close(self):
+        self.__executor.shutdown(wait=True)
+
+    async def createBuilding(self, data):
+        return await self.__call(self.xiq.createBuilding, data)
+
+    async def uploadFloorplan(self, filename, floorname, imageDir):
+        return await self.__call(self.xiq.uploadFloorplan, filename, floorname, imageDir)
+
+    async def createFloor(self, data):
+        return await self.__call(self.xiq.createFloor, data)
+
+    async def advanceOnboardAPs(self, data, lro=False):
+        return await self.__call(self.xiq.advanceOnboardAPs, data, lro=lro)
+
+    async def checkLRO(self, url):
+        return await self.__call(self.xiq.checkLRO, url)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Benchmarks the import pipeline on synthetic Ekahau projects of increasing size.
+
+For every size, a project and a matching CSV are generated with
+esx_generator, then Ekahau.exportFile, apSerialCSV.getSerialNumbers and
+buildOnboardList from the main script are each timed over several runs.
+Results can be saved with --save and compared to a saved run with
+--compare, which fails when any median is slower by more than --tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from esx_generator import generateEsx, generateCsv
+from app.Ekahau_importer import Ekahau
+from app.ap_csv_importer import apSerialCSV
+from XIQ_Ekahau_Importer import buildOnboardList
+
+# name: (buildings, floors per building, APs per floor, floor image resolution)
+SIZES = {
+    'small': (1, 2, 25, (1200, 900)),
+    'medium': (2, 4, 100, (2400, 1800)),
+    'large': (4, 6, 250, (4800, 3600)),
+    'xlarge': (8, 8, 500, (7200, 5400)),
+}
+
+def timeRuns(function, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def benchSize(name, runs, jobs, workspace, legacy=False):
+    buildings, floors, aps, resolution = SIZES[name]
+    esxFile = os.path.join(workspace, f"{name}.esx")
+    csvFile = os.path.join(workspace, f"{name}.csv")
+    apSerials = generateEsx(esxFile, buildings=buildings, floors=floors, aps=aps, resolution=resolution, legacy=legacy)
+    generateCsv(csvFile, apSerials, unknown=len(apSerials) // 10)
+
+    def exportFile():
+        imageDir = tempfile.mkdtemp(dir=workspace)
+        try:
+            # the pre-10.3 warning is printed by the importer
+            with contextlib.redirect_stdout(io.StringIO()):
+                return Ekahau(esxFile, jobs=jobs, imageDir=imageDir).exportFile()
+        finally:
+            shutil.rmtree(imageDir, ignore_errors=True)
+
+    ekahauData = exportFile()
+    aps = ekahauData['aps']
+    for count, floor in enumerate(ekahauData['floors']):
+        floor.xiq_floor_id = 1000 + count
+
+    results = {
+        'exportFile': timeRuns(exportFile, runs),
+        'getSerialNumbers': timeRuns(lambda: apSerialCSV(csvFile, aps).getSerialNumbers(), runs),
+        'buildOnboardList': timeRuns(lambda: buildOnboardList(aps, ekahauData['floors'], 1), runs),
+    }
+    return {'size': name, 'floors': len(ekahauData['floors']), 'aps': len(aps), 'resolution': 'x'.join(map(str, resolution)),
+            'legacy': legacy, 'timings': {stage: statistics.median(timings) for stage, timings in results.items()},
+            'min': {stage: min(timings) for stage, timings in results.items()}}
+
+def compare(results, baseline, tolerance):
+    """Returns the stages whose median got slower than the baseline by more than tolerance"""
+    previous = {(r['size'], r['legacy']): r['timings'] for r in baseline}
+    regressions = []
+    for result in results:
+        for stage, median in result['timings'].items():
+            before = previous.get((result['size'], result['legacy']), {}).get(stage)
+            if before and median > before * (1 + tolerance):
+                regressions.append(f"{result['size']}{' legacy' if result['legacy'] else ''} {stage}: "
+                                   f"{before * 1000:.1f} ms -> {median * 1000:.1f} ms ({median / before - 1:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='small,medium,large', help=f"Comma separated sizes to run, from {', '.join(SIZES)} (default small,medium,large)")
+    parser.add_argument('--runs', type=int, default=3, help="Number of timed runs of every stage (default 3)")
+    parser.add_argument('--jobs', type=int, default=1, help="Floor images processed at the same time by exportFile (default 1)")
+    parser.add_argument('--legacy', action='store_true', help="Also run every size as a pre-10.3 project without crop and rotation")
+    parser.add_argument('--save', metavar='FILE', help="Save the results as JSON to FILE")
+    parser.add_argument('--compare', metavar='FILE', help="Compare to results saved with --save and exit with 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown of a median with --compare (default 0.2 = 20%%)")
+    args = parser.parse_args()
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes {', '.join(unknown)}")
+
+    results = []
+    workspace = tempfile.mkdtemp(prefix='xiq_ekahau_bench_')
+    try:
+        print(f"{'Size':<14} {'Floors':>6} {'APs':>6} {'Resolution':>10}  {'exportFile':>11} {'getSerialNumbers':>17} {'buildOnboardList':>17}")
+        for size in sizes:
+            for legacy in ([False, True] if args.legacy else [False]):
+                result = benchSize(size, args.runs, args.jobs, workspace, legacy=legacy)
+                results.append(result)
+                timings = result['timings']
+                print(f"{size + (' legacy' if legacy else ''):<14} {result['floors']:>6} {result['aps']:>6} {result['resolution']:>10}  "
+                      f"{timings['exportFile'] * 1000:>8.1f} ms {timings['getSerialNumbers'] * 1000:>14.1f} ms "
+                      f"{timings['buildOnboardList'] * 1000:>14.1f} ms")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against " + args.compare)
+            print(*regressions, sep='\n')
+            raise SystemExit(1)
+        print(f"\nNo stage is more than {args.tolerance:.0%} slower than {args.compare}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Benchmarks the XIQ side of an import against the local mock XIQ server.
+
+A synthetic project is generated with esx_generator and exported once.
+Then, for every --concurrency, it is imported into a fresh mock_xiq
+server: its buildings and floors are created with createLocations from
+the main script, without waiting for XIQ to process the floorplans, and
+its APs are onboarded with a long running operation. The wall time, the
+XIQ calls per second and the 429 and 5xx answers of the mock are reported.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from esx_generator import generateEsx
+from mock_xiq import MockXIQ
+from app.Ekahau_importer import Ekahau
+from app.rate_limiter import RateLimiter
+from app.xiq_exporter import XIQ, AsyncXIQ
+from XIQ_Ekahau_Importer import buildOnboardList, createLocations
+
+def importProject(mock, ekahauData, imageDir, concurrency, rate=None, burst=None):
+    """Imports ekahauData into mock like importProject of the main script, without the questions"""
+    rateLimiter = RateLimiter(rate, burst=burst) if rate else None
+    xiq = XIQ('bench@example.com', 'password', poolSize=max(10, concurrency), rateLimiter=rateLimiter, url=mock.url)
+    try:
+        location_df = xiq.gatherLocations()
+        siteId = int(location_df.loc[location_df['type'] == 'SITE', 'id'].values[0])
+        buildings = {building.building_id: building for building in ekahauData['building']}
+        pendingBuildings = []
+        for building in buildings.values():
+            building.xiq_building_id = None
+            data = building.payload(siteId)
+            data['address'] = {"address": "Unknown", "city": "Unknown", "state": "Unknown", "postal_code": "Unknown"}
+            pendingBuildings.append((building, data))
+        pendingFloors = [(floor, buildings[floor.associated_building_id], floor.payload(None)) for floor in ekahauData['floors']]
+        summary = {'buildings': 0, 'floors': 0}
+        # the progress of every building and floor is printed
+        asyncXiq = AsyncXIQ(xiq, concurrency=concurrency)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(createLocations(asyncXiq, pendingBuildings, pendingFloors, imageDir, summary, floorplanWait=0))
+        finally:
+            asyncXiq.close()
+        np_id = xiq.collectNetworkPolicies()['data'][0]['id']
+        onboardList = buildOnboardList([ap for ap in ekahauData['aps'] if ap.sn], ekahauData['floors'], np_id)
+        lroUrl = xiq.advanceOnboardAPs({"extreme": onboardList, "unmanaged": False}, lro=True)
+        data = xiq.checkLRO(lroUrl)
+        while data['metadata']['status'] != 'SUCCEEDED':
+            time.sleep(0.1)
+            data = xiq.checkLRO(lroUrl)
+        summary['onboarded'] = len(data['response']['success_devices'])
+        summary['waited'] = rateLimiter.waited if rateLimiter else 0.0
+        return summary
+    finally:
+        xiq.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buildings', type=int, default=4, help="Number of buildings (default 4)")
+    parser.add_argument('--floors', type=int, default=6, help="Number of floors per building (default 6)")
+    parser.add_argument('--aps', type=int, default=40, help="Number of APs per floor (default 40)")
+    parser.add_argument('--concurrency', default='1,4,8', help="Comma separated XIQ call concurrencies to run (default 1,4,8)")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds every mock request is delayed by (default 0.05)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many more seconds of random mock delay (default 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of mock requests that fail, 0 to 1 (default 0)")
+    parser.add_argument('--error-status', type=int, default=503, help="HTTP status of the failed mock requests (default 503)")
+    parser.add_argument('--rate-limit', type=float, help="Requests per second the mock allows before answering 429 (default no limit)")
+    parser.add_argument('--rate', type=float, help="Client side --rate limit of the importer (default no limit)")
+    parser.add_argument('--burst', type=int, help="Client side --burst of the importer")
+    args = parser.parse_args()
+    try:
+        concurrencies = [int(value) for value in args.concurrency.split(',') if value.strip()]
+    except ValueError:
+        parser.error("--concurrency must be comma separated numbers")
+    if not concurrencies or min(concurrencies) < 1:
+        parser.error("--concurrency must be 1 or greater")
+
+    workspace = tempfile.mkdtemp(prefix='xiq_mock_bench_')
+    try:
+        esxFile = os.path.join(workspace, 'project.esx')
+        generateEsx(esxFile, buildings=args.buildings, floors=args.floors, aps=args.aps, resolution=(800, 600), serialRatio=1.0)
+        imageDir = os.path.join(workspace, 'images')
+        with contextlib.redirect_stdout(io.StringIO()):
+            ekahauData = Ekahau(esxFile, imageDir=imageDir).exportFile()
+        # gatherLocations imports pandas, it is imported here so the first run does not time it
+        import pandas
+        print(f"{len(ekahauData['building'])} buildings, {len(ekahauData['floors'])} floors and {len(ekahauData['aps'])} APs, "
+              f"{args.latency * 1000:.0f} ms latency")
+        print(f"{'Concurrency':>11} {'Wall':>9} {'Calls':>6} {'Calls/s':>8} {'429':>5} {'5xx':>5} {'Rate wait':>10}")
+        for concurrency in concurrencies:
+            mock = MockXIQ(latency=args.latency, jitter=args.jitter, errorRate=args.error_rate, errorStatus=args.error_status,
+                           rateLimit=args.rate_limit).start()
+            try:
+                start = time.perf_counter()
+                summary = importProject(mock, ekahauData, imageDir, concurrency, rate=args.rate, burst=args.burst)
+                wall = time.perf_counter() - start
+            finally:
+                mock.stop()
+            calls = sum(mock.stats['requests'].values())
+            statuses = mock.stats['statuses']
+            print(f"{concurrency:>11} {wall:>7.2f} s {calls:>6} {calls / wall:>8.1f} {statuses[429]:>5} "
+                  f"{sum(count for status, count in statuses.items() if status >= 500):>5} {summary['waited']:>8.1f} s")
+            if summary['floors'] != len(ekahauData['floors']) or summary['onboarded'] != len(ekahauData['aps']):
+                print(f"  only {summary['floors']} floors and {summary['onboarded']} APs were imported")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Generates synthetic Ekahau 10.x (.esx) projects for benchmarking the importer.
+
+The projects have a configurable number of buildings, floors per building,
+APs per floor and floor image resolution. Floors cycle through every
+rotateUpDirection and through stored and deflated, bitmap and regular
+images. With legacy=True the floor plans have no crop or rotation fields,
+like files saved before Ekahau 10.3.
+"""
+import argparse
+import csv
+import json
+import random
+import uuid
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+import cv2
+import numpy as np
+
+ROTATIONS = ['UP', 'RIGHT', 'DOWN', 'LEFT']
+
+def newId(rnd):
+    return str(uuid.UUID(int=rnd.getrandbits(128)))
+
+def floorImage(width, height, rnd):
+    """A floor-plan-like PNG: walls on a white background with some noise so it does not compress to nothing"""
+    image = np.full((height, width, 3), 255, np.uint8)
+    for _ in range(max(4, (width + height) // 100)):
+        if rnd.random() < 0.5:
+            y = rnd.randrange(height)
+            cv2.line(image, (rnd.randrange(width // 2), y), (rnd.randrange(width // 2, width), y), (40, 40, 40), rnd.choice([2, 4, 6]))
+        else:
+            x = rnd.randrange(width)
+            cv2.line(image, (x, rnd.randrange(height // 2)), (x, rnd.randrange(height // 2, height)), (40, 40, 40), rnd.choice([2, 4, 6]))
+    noise = np.random.default_rng(rnd.getrandbits(32)).integers(0, 24, (height, width, 1), np.uint8)
+    image -= noise
+    status, buffer = cv2.imencode('.png', image)
+    if not status:
+        raise ValueError(f"Unable to encode a {width}x{height} floor image")
+    return buffer.tobytes()
+
+def generateEsx(filename, buildings=1, floors=4, aps=50, resolution=(2000, 1500), legacy=False, serialRatio=0.5,
+                address="1 Main St, Town, ST, 12345", seed=0):
+    """Writes a synthetic .esx project to filename.
+
+    Every building gets floors floors of aps APs each. serialRatio of the
+    APs carry their serial number in their name ("name :: serial"), the
+    rest only have a name, to be matched from a CSV file.
+
+    Returns the list of (AP name, serial number) of every AP.
+    """
+    rnd = random.Random(seed)
+    width, height = resolution
+    floorType = {'id': newId(rnd), 'name': 'Drywall', 'propagationProperties': [{'attenuationFactor': 12.0}]}
+    sections = {'buildings': [], 'floorPlans': [], 'accessPoints': [], 'buildingFloors': [], 'images': []}
+    apSerials = []
+    with ZipFile(filename, 'w', ZIP_DEFLATED) as zip:
+        floorCount = 0
+        for b in range(buildings):
+            buildingId = newId(rnd)
+            sections['buildings'].append({'id': buildingId, 'name': f"Building {b + 1:03d}"})
+            for f in range(floors):
+                floorId = newId(rnd)
+                imageId = newId(rnd)
+                # alternate the image resolution a little, so floors are scaled differently
+                rawWidth, rawHeight = width + 16 * (floorCount % 3), height + 8 * (floorCount % 2)
+                zip.writestr(f"image-{imageId}", floorImage(rawWidth, rawHeight, rnd),
+                             compress_type=ZIP_STORED if floorCount % 2 else ZIP_DEFLATED)
+                sections['images'].append({'id': imageId, 'imageFormat': 'PNG',
+                                           'resolutionWidth': rawWidth, 'resolutionHeight': rawHeight})
+                mapWidth, mapHeight = rawWidth / 2, rawHeight / 2
+                floorPlan = {'id': floorId, 'name': f"Floor {f + 1}", 'width': mapWidth, 'height': mapHeight,
+                             'metersPerUnit': 0.05 + 0.01 * (floorCount % 5)}
+                if floorCount % 4 == 3:
+                    floorPlan['imageId'] = newId(rnd)
+                    floorPlan['bitmapImageId'] = imageId
+                else:
+                    floorPlan['imageId'] = imageId
+                if not legacy:
+                    floorPlan.update(cropMinX=mapWidth * 0.05, cropMinY=mapHeight * 0.04,
+                                     cropMaxX=mapWidth * 0.97, cropMaxY=mapHeight * 0.95,
+                                     rotateUpDirection=ROTATIONS[floorCount % len(ROTATIONS)])
+                sections['floorPlans'].append(floorPlan)
+                sections['buildingFloors'].append({'id': newId(rnd), 'buildingId': buildingId, 'floorPlanId': floorId,
+                                                   'floorTypeId': floorType['id'], 'height': 3.0 + 0.5 * f, 'thickness': 0.3})
+                for a in range(aps):
+                    name = f"AP-{b + 1:03d}-{f + 1:02d}-{a + 1:04d}"
+                    serial = f"SN{b + 1:03d}{f + 1:02d}{a + 1:05d}"
+                    apSerials.append((name, serial))
+                    sections['accessPoints'].append({
+                        'id': newId(rnd),
+                        'name': f"{name} :: {serial}" if rnd.random() < serialRatio else name,
+                        'location': {'floorPlanId': floorId,
+                                     'coord': {'x': rnd.uniform(mapWidth * 0.1, mapWidth * 0.9),
+                                               'y': rnd.uniform(mapHeight * 0.1, mapHeight * 0.9)}},
+                        'mine': True,
+                        'tags': []
+                    })
+                floorCount += 1
+        # an AP that was never placed on a floor
+        sections['accessPoints'].append({'id': newId(rnd), 'name': 'Unplaced AP', 'mine': True, 'tags': []})
+        zip.writestr('project.json', json.dumps({'project': {'id': newId(rnd), 'name': 'Synthetic', 'location': address}}))
+        zip.writestr('floorTypes.json', json.dumps({'floorTypes': [floorType]}))
+        zip.writestr('deviceProfiles.json', json.dumps({'deviceProfiles': []}))
+        for item, values in sections.items():
+            zip.writestr(f"{item}.json", json.dumps({item: values}))
+    return apSerials
+
+def generateCsv(filename, apSerials, unknown=0, seed=0):
+    """Writes the AP Name/Serial Number CSV of apSerials in random order, plus unknown rows that match no AP"""
+    rnd = random.Random(seed)
+    rows = list(apSerials) + [(f"Unknown-AP-{i + 1:04d}", f"UNKNOWN{i + 1:05d}") for i in range(unknown)]
+    rnd.shuffle(rows)
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['AP Name', 'Serial Number'])
+        writer.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filename', help="The .esx file to write")
+    parser.add_argument('--buildings', type=int, default=1, help="Number of buildings (default 1)")
+    parser.add_argument('--floors', type=int, default=4, help="Number of floors per building (default 4)")
+    parser.add_argument('--aps', type=int, default=50, help="Number of APs per floor (default 50)")
+    parser.add_argument('--resolution', default='2000x1500', help="Floor image resolution WIDTHxHEIGHT (default 2000x1500)")
+    parser.add_argument('--legacy', action='store_true', help="Leave out the crop and rotation fields, like files older than Ekahau 10.3")
+    parser.add_argument('--csv', help="Also write the AP Name/Serial Number CSV of every AP to this file")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default 0)")
+    args = parser.parse_args()
+    try:
+        width, height = (int(value) for value in args.resolution.lower().split('x'))
+    except ValueError:
+        parser.error("--resolution must be WIDTHxHEIGHT")
+
+    apSerials = generateEsx(args.filename, buildings=args.buildings, floors=args.floors, aps=args.aps,
+                            resolution=(width, height), legacy=args.legacy, seed=args.seed)
+    if args.csv:
+        generateCsv(args.csv, apSerials, unknown=len(apSerials) // 10, seed=args.seed)
+    print(f"Wrote {args.filename} with {args.buildings * args.floors} floors and {len(apSerials)} APs")
+
+if __name__ == '__main__':
+    main()
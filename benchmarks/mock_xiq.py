@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""Local stand-in for the ExtremeCloud IQ API calls made by the importer.
+
+Implements the endpoints app.xiq_exporter.XIQ uses and keeps the locations,
+floorplans and devices created through them in memory. Latency, errors and
+a rate limit can be injected, so the retries, the rate limiter and the
+throughput of an import can be exercised without an XIQ account:
+
+    python benchmarks/mock_xiq.py --port 8080 --latency 0.2 --rate-limit 10
+    python XIQ_Ekahau_Importer.py --xiq-url http://127.0.0.1:8080
+
+Any user name and password can log in.
+"""
+import argparse
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import default as defaultPolicy
+import itertools
+import json
+import math
+import random
+import re
+import signal
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+COUNTRIES = [
+    {'alpha2_code': 'US', 'short_name': 'United States', 'country_code': 840},
+    {'alpha2_code': 'CA', 'short_name': 'Canada', 'country_code': 124},
+    {'alpha2_code': 'GB', 'short_name': 'United Kingdom', 'country_code': 826},
+    {'alpha2_code': 'DE', 'short_name': 'Germany', 'country_code': 276},
+    {'alpha2_code': 'AU', 'short_name': 'Australia', 'country_code': 36},
+]
+
+class MockError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class MockXIQ:
+    """In-memory XIQ served over HTTP on host:port, port 0 picks a free port.
+
+    Every request is delayed by latency plus up to jitter seconds. With
+    rateLimit, requests beyond rateLimit per second, in bursts of up to
+    burst, are answered 429 with a Retry-After. errorRate of the other
+    requests fail with errorStatus without being processed. A long running
+    onboarding operation stays PENDING for lroSeconds.
+    Counts of the requests by endpoint and by status are kept in stats.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, errorRate=0.0, errorStatus=500,
+                 rateLimit=None, burst=None, lroSeconds=0.0, policies=3, locations=True, seed=0, verbose=False):
+        self.verbose = verbose
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.rateLimit = rateLimit
+        self.burst = burst if burst else max(1, int(rateLimit or 1))
+        self.lroSeconds = lroSeconds
+        self.stats = {'requests': Counter(), 'statuses': Counter()}
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__ids = itertools.count(1000)
+        self.__tokens = self.burst
+        self.__updated = time.monotonic()
+        self.accounts = {1: 'Mock VIQ', 2: 'Mock External VIQ'}
+        self.tokens = {}
+        self.locations = {}
+        self.floorplans = set()
+        self.devices = {}
+        self.operations = {}
+        self.policies = [{'id': 100 + i, 'name': f"Mock Policy {i + 1}"} for i in range(policies)]
+        if locations:
+            root = self.__addLocation(None, self.accounts[1], 'Global')
+            self.__addLocation(root['id'], 'Mock Site', 'SITE')
+        self.server = ThreadingHTTPServer((host, port), MockHandler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.__thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.server.serve_forever, name='mock-xiq', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.__thread:
+            self.__thread.join()
+
+    # FAULTS
+    def __throttle(self):
+        # token bucket of the rate limit, returns the seconds until the next request is allowed
+        now = time.monotonic()
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rateLimit)
+        self.__updated = now
+        if self.__tokens >= 1:
+            self.__tokens -= 1
+            return 0
+        return (1 - self.__tokens) / self.rateLimit
+
+    def fault(self):
+        """Sleeps the latency and returns the (status, body, headers) of an injected failure, or None"""
+        with self.__lock:
+            delay = self.latency + self.__random.uniform(0, self.jitter)
+            failed = self.__random.random() < self.errorRate
+        if delay:
+            time.sleep(delay)
+        if self.rateLimit:
+            with self.__lock:
+                wait = self.__throttle()
+            if wait:
+                return 429, {'error_code': 'TOO_MANY_REQUESTS', 'error_message': 'Rate limit exceeded'}, {'Retry-After': str(max(1, math.ceil(wait)))}
+        if failed:
+            return self.errorStatus, {'error_code': 'INJECTED', 'error_message': 'Injected failure'}, {}
+        return None
+
+    def record(self, method, route, status):
+        with self.__lock:
+            self.stats['requests'][f"{method} {route}"] += 1
+            self.stats['statuses'][status] += 1
+
+    # LOCATIONS
+    def __addLocation(self, parentId, name, type, **fields):
+        location = dict(fields, id=next(self.__ids), name=name, type=type, children=[])
+        if parentId is not None:
+            location['parent_id'] = parentId
+            self.locations[parentId]['children'].append(location['id'])
+        self.locations[location['id']] = location
+        return location
+
+    def __tree(self, location):
+        node = {key: value for key, value in location.items() if key != 'children'}
+        if 'parent_id' not in location:
+            del node['type']
+        node['children'] = [self.__tree(self.locations[child]) for child in location['children']]
+        return node
+
+    def __createLocation(self, data, type, parentTypes):
+        name = (data.get('name') or '').strip()
+        if not name:
+            raise MockError(400, 'name is required')
+        parent = self.locations.get(self.__int(data.get('parent_id')))
+        if parent is None or parent['type'] not in parentTypes:
+            raise MockError(400, f"parent_id {data.get('parent_id')} is not a {' or '.join(parentTypes)}")
+        if type != 'FLOOR' and any(location['name'] == name and location['type'] != 'FLOOR' for location in self.locations.values()):
+            raise MockError(400, f"The name {name} already exists")
+        if type == 'FLOOR':
+            if any(self.locations[child]['name'] == name for child in parent['children']):
+                raise MockError(400, f"The floor {name} already exists in {parent['name']}")
+            if data.get('map_name') and data['map_name'] not in self.floorplans:
+                raise MockError(400, f"The floorplan {data['map_name']} was not uploaded")
+        fields = {key: value for key, value in data.items() if key not in ('name', 'parent_id')}
+        return self.__addLocation(parent['id'], name, type, **fields)
+
+    @staticmethod
+    def __int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    # DEVICES
+    def __onboard(self, data):
+        result = {'success_devices': [], 'failure_devices': []}
+        policyIds = {policy['id'] for policy in self.policies}
+        for device in data.get('extreme', []):
+            serial = device.get('serial_number') or ''
+            location = self.locations.get(self.__int(device.get('location', {}).get('location_id')))
+            if not re.fullmatch(r'[A-Za-z0-9]{6,}', serial):
+                error = 'PRODUCT_TYPE_NOT_EXIST'
+            elif serial in self.devices:
+                error = 'DEVICE_EXISTED'
+            elif location is None or location['type'] != 'FLOOR':
+                error = 'LOCATION_NOT_EXIST'
+            elif device.get('network_policy_id') not in policyIds:
+                error = 'NETWORK_POLICY_NOT_EXIST'
+            else:
+                self.devices[serial] = next(self.__ids)
+                result['success_devices'].append({'serial_number': serial, 'device_id': self.devices[serial]})
+                continue
+            result['failure_devices'].append({'serial_number': serial, 'error': error})
+        # like XIQ, a list without devices is left out
+        return {key: devices for key, devices in result.items() if devices}
+
+    # ROUTES
+    def handle(self, method, path, query, headers, body, base):
+        """Returns the (status, body, headers) of a request that was not failed by fault(), base is the URL it was sent to"""
+        if (method, path) == ('POST', '/login'):
+            token = uuid.uuid4().hex
+            with self.__lock:
+                self.tokens[token] = 1
+            return 200, {'access_token': token, 'token_type': 'Bearer'}, {}
+        token = headers.get('Authorization', '').removeprefix('Bearer ')
+        with self.__lock:
+            if token not in self.tokens:
+                return 401, {'error_code': 'UNAUTHORIZED', 'error_message': 'Invalid access token'}, {}
+            account = self.tokens[token]
+            if method == 'GET':
+                return self.__get(path, query, account)
+            if method == 'POST':
+                return self.__post(path, query, headers, body, account, base)
+        raise MockError(405, f"{method} is not supported on {path}")
+
+    def __get(self, path, query, account):
+        if path == '/account/home':
+            return 200, {'id': account, 'name': self.accounts[account]}, {}
+        if path == '/account/external':
+            return 200, [{'id': id, 'name': name} for id, name in self.accounts.items() if id != account], {}
+        if path == '/locations/tree':
+            return 200, [self.__tree(location) for location in self.locations.values() if 'parent_id' not in location], {}
+        if path == '/countries':
+            return 200, COUNTRIES, {}
+        if path == '/network-policies':
+            policies = self.policies
+            if 'policyNames' in query:
+                names = set(query['policyNames'][0].split(','))
+                policies = [policy for policy in policies if policy['name'] in names]
+            page = self.__int(query.get('page', ['1'])[0]) or 1
+            limit = self.__int(query.get('limit', ['10'])[0]) or 10
+            return 200, {'page': page, 'count': limit, 'total_count': len(policies),
+                         'data': policies[(page - 1) * limit:page * limit]}, {}
+        match = re.fullmatch(r'/operations/([0-9a-f]+)', path)
+        if match and match.group(1) in self.operations:
+            ready, response = self.operations[match.group(1)]
+            if time.monotonic() < ready:
+                return 200, {'metadata': {'status': 'PENDING'}}, {}
+            return 200, {'metadata': {'status': 'SUCCEEDED'}, 'response': response}, {}
+        raise MockError(404, f"GET {path} was not found")
+
+    def __post(self, path, query, headers, body, account, base):
+        if path == '/locations/floorplan':
+            message = BytesParser(policy=defaultPolicy).parsebytes(
+                f"Content-Type: {headers.get('Content-Type', '')}\r\n\r\n".encode() + body)
+            files = [part.get_filename() for part in message.iter_parts() if part.get_filename()] if message.is_multipart() else []
+            if not files:
+                raise MockError(400, 'No file was uploaded')
+            self.floorplans.update(files)
+            return 200, {}, {}
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise MockError(400, 'The request body is not valid JSON')
+        if path == '/account/:switch':
+            viqId = self.__int(query.get('id', [''])[0])
+            if viqId not in self.accounts:
+                raise MockError(400, f"Account {viqId} does not exist")
+            token = uuid.uuid4().hex
+            self.tokens[token] = viqId
+            return 200, {'access_token': token, 'token_type': 'Bearer'}, {}
+        if path == '/locations/:init':
+            if self.locations:
+                raise MockError(400, 'The locations are already initialized')
+            return 200, self.__tree(self.__addLocation(None, data.get('organization') or self.accounts[account], 'Global')), {}
+        routes = {
+            '/locations': ('Site_Group', ['Global', 'Site_Group']),
+            '/locations/site': ('SITE', ['Global', 'Site_Group']),
+            '/locations/building': ('BUILDING', ['SITE']),
+            '/locations/floor': ('FLOOR', ['BUILDING']),
+        }
+        if path in routes:
+            location = self.__createLocation(data, *routes[path])
+            return 200, {key: value for key, value in location.items() if key != 'children'}, {}
+        if path == '/devices/:advanced-onboard':
+            result = self.__onboard(data)
+            if query.get('async', ['False'])[0].lower() == 'true':
+                operation = uuid.uuid4().hex
+                self.operations[operation] = (time.monotonic() + self.lroSeconds, result)
+                return 202, {}, {'Location': f"{base}/operations/{operation}"}
+            return 200, result, {}
+        raise MockError(404, f"POST {path} was not found")
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.__respond('GET')
+
+    def do_POST(self):
+        self.__respond('POST')
+
+    def do_PUT(self):
+        self.__respond('PUT')
+
+    def __respond(self, method):
+        mock = self.server.mock
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        url = urlsplit(self.path)
+        route = re.sub(r'/(\d+|[0-9a-f]{32})(?=/|$)', '/{id}', url.path)
+        base = f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+        result = mock.fault()
+        if result is None:
+            try:
+                result = mock.handle(method, url.path, parse_qs(url.query), dict(self.headers), body, base)
+            except MockError as e:
+                result = e.status, {'error_code': 'BAD_REQUEST' if e.status == 400 else 'ERROR', 'error_message': str(e)}, {}
+        status, data, extraHeaders = result
+        mock.record(method, route, status)
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in extraHeaders.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.mock.verbose:
+            super().log_message(format, *args)
+
+def printStats(stats):
+    print(f"{sum(stats['requests'].values())} requests")
+    for request, count in sorted(stats['requests'].items()):
+        print(f"  {request:<40} {count:>6}")
+    print("Statuses " + ", ".join(f"{status}: {count}" for status, count in sorted(stats['statuses'].items())))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on, 0 for any free port (default 8080)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds every request is delayed by (default 0)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many more seconds of random delay (default 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests that fail without being processed, 0 to 1 (default 0)")
+    parser.add_argument('--error-status', type=int, default=500, help="HTTP status of the failed requests (default 500)")
+    parser.add_argument('--rate-limit', type=float, help="Requests per second allowed before answering 429 (default no limit)")
+    parser.add_argument('--burst', type=int, help="Requests allowed at once before --rate-limit applies (default the rate, at least 1)")
+    parser.add_argument('--lro-seconds', type=float, default=0.0, help="Seconds a long running onboarding operation stays PENDING (default 0)")
+    parser.add_argument('--policies', type=int, default=3, help="Number of network policies (default 3)")
+    parser.add_argument('--no-locations', action='store_true', help="Start without a location tree, so the importer initializes it")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the latency jitter and the failures (default 0)")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+    if not 0 <= args.error_rate <= 1:
+        parser.error("--error-rate must be between 0 and 1")
+    if args.rate_limit is not None and args.rate_limit <= 0:
+        parser.error("--rate-limit must be greater than 0")
+
+    mock = MockXIQ(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter, errorRate=args.error_rate,
+                   errorStatus=args.error_status, rateLimit=args.rate_limit, burst=args.burst, lroSeconds=args.lro_seconds,
+                   policies=args.policies, locations=not args.no_locations, seed=args.seed, verbose=args.verbose)
+    # stopped like Ctrl+C, so the statistics are printed as well
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Mock XIQ listening on {mock.url}, stop with Ctrl+C", flush=True)
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        mock.server.server_close()
+        printStats(mock.stats)
+
+if __name__ == '__main__':
+    main()
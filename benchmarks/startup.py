@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Startup time of XIQ_Ekahau_Importer.py.
+
+Every measurement runs in a fresh interpreter: --help, an argument error,
+the time until the first prompt is shown, and the time to import each app
+module along with which of pandas, numpy and cv2 that import loads.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'XIQ_Ekahau_Importer.py')
+HEAVY = ('pandas', 'numpy', 'cv2', 'requests')
+MODULES = ['XIQ_Ekahau_Importer', 'mapImportLogger', 'app.Ekahau_importer', 'app.xiq_exporter',
+           'app.ap_csv_importer', 'app.image_cache', 'app.project_cache']
+
+def timeCommand(command):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=ROOT, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def timePrompt(prompt=b'Please enter the Ekahau File: '):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, SCRIPT], cwd=ROOT, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b''
+    while prompt not in output:
+        byte = process.stdout.read(1)
+        if not byte:
+            break
+        output += byte
+    elapsed = time.perf_counter() - start
+    # closing stdin ends the prompt with EOF, so the script still removes its workspace
+    process.stdin.close()
+    process.wait()
+    if prompt not in output:
+        raise RuntimeError(f"{SCRIPT} exited before prompting: {output.decode(errors='replace')}")
+    return elapsed
+
+def importModule(module):
+    code = ("import sys, time; start = time.perf_counter(); "
+            f"import {module}; elapsed = time.perf_counter() - start; "
+            f"print(elapsed, ','.join(m for m in {HEAVY!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    elapsed, loaded = result.stdout.split()[0], result.stdout.split()[1:]
+    return float(elapsed), loaded[0] if loaded else '-'
+
+def report(name, timings):
+    print(f"  {name:<32} median {statistics.median(timings) * 1000:8.1f} ms   min {min(timings) * 1000:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="Number of runs of each measurement (default 5)")
+    args = parser.parse_args()
+
+    print(f"Startup of {os.path.basename(SCRIPT)} over {args.runs} runs")
+    report('--help', [timeCommand([sys.executable, SCRIPT, '--help']) for _ in range(args.runs)])
+    report('argument error (--jobs 0)', [timeCommand([sys.executable, SCRIPT, '--jobs', '0']) for _ in range(args.runs)])
+    report('first prompt', [timePrompt() for _ in range(args.runs)])
+    report('bare interpreter', [timeCommand([sys.executable, '-c', 'pass']) for _ in range(args.runs)])
+
+    print("\nModule imports")
+    for module in MODULES:
+        results = [importModule(module) for _ in range(args.runs)]
+        print(f"  {module:<32} median {statistics.median(r[0] for r in results) * 1000:8.1f} ms   loads {results[0][1]}")
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,9 @@ log_formatter = logging.Formatter('%(asctime)s: %(name)s - %(levelname)s - %(mes
 
 logFile = '{}/map_importer.log'.format(PATH)
 
-# Rotate file at 50MB
+# Rotate file at 50MB, the file is only opened once the first message is logged
 my_handler = RotatingFileHandler(logFile, mode='a', maxBytes=50*1024*1024, 
-                                 backupCount=5, encoding=None, delay=0)
+                                 backupCount=5, encoding=None, delay=True)
 
 my_handler.setFormatter(log_formatter)
 my_handler.setLevel(logging.INFO)
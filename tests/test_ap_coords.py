@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Checks transformAPCoords against the per-AP scalar transform it replaced."""
+import json
+import os
+import sys
+from zipfile import ZipFile
+import numpy as np
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from esx_generator import generateEsx
+from app.Ekahau_importer import Ekahau, FloorGeometry, transformAPCoords
+
+ROTATIONS = ['UP', 'RIGHT', 'LEFT', 'DOWN']
+
+def scalarAPCoord(geometry, rawX, rawY):
+    # the transform of one AP as Ekahau.__updateAPCoord did it before it was vectorized
+    minX, minY, maxX, maxY = geometry.minX, geometry.minY, geometry.maxX, geometry.maxY
+    metersPerUnit = geometry.metersPerUnit
+    orientation = geometry.rotateUpDirection
+    rawX = rawX  * geometry.x_scale
+    rawY = rawY  * geometry.y_scale
+
+    if orientation == 'UP':
+        x = (rawX - minX) * metersPerUnit
+        y = (rawY - minY) * metersPerUnit
+    elif orientation == "RIGHT":
+        y = (rawX - minX) * metersPerUnit
+        x = (maxY - rawY) * metersPerUnit
+    elif orientation == "LEFT":
+        x = (rawY - minY) * metersPerUnit
+        y = (maxX - rawX) * metersPerUnit
+    elif orientation == "DOWN":
+        x = (maxX - rawX) * metersPerUnit
+        y = (maxY - rawY) * metersPerUnit
+
+    return x,y
+
+def exportProject(tmp_path, legacy):
+    esxFile = str(tmp_path / 'project.esx')
+    # floors cycle through every rotateUpDirection and images of slightly different sizes
+    generateEsx(esxFile, buildings=1, floors=8, aps=25, resolution=(401, 303), legacy=legacy)
+    ekahau = Ekahau(esxFile, imageDir=str(tmp_path / 'images'))
+    ekahauData = ekahau.exportFile()
+    with ZipFile(esxFile) as zip:
+        accessPoints = json.loads(zip.read('accessPoints.json'))['accessPoints']
+    rawCoords = {}
+    for ap in accessPoints:
+        if 'location' in ap:
+            name = ap['name'].split('::')[0].strip()
+            rawCoords[name] = (ap['location']['floorPlanId'], ap['location']['coord']['x'], ap['location']['coord']['y'])
+    return ekahau.floorGeometry, ekahauData, rawCoords
+
+@pytest.fixture(scope='module')
+def project(tmp_path_factory):
+    return exportProject(tmp_path_factory.mktemp('project'), legacy=False)
+
+@pytest.fixture(scope='module')
+def legacyProject(tmp_path_factory):
+    return exportProject(tmp_path_factory.mktemp('legacy'), legacy=True)
+
+def assertFloorsAgree(floorGeometry, rawCoords, floorIds):
+    assert floorIds
+    for floor_id in floorIds:
+        coords = [(x, y) for floor, x, y in rawCoords.values() if floor == floor_id]
+        rawX = np.array([x for x, _ in coords])
+        rawY = np.array([y for _, y in coords])
+        geometry = floorGeometry[floor_id]
+        x, y = transformAPCoords(geometry, rawX, rawY)
+        expected = [scalarAPCoord(geometry, rx, ry) for rx, ry in coords]
+        assert np.allclose(x, [ex for ex, _ in expected])
+        assert np.allclose(y, [ey for _, ey in expected])
+
+@pytest.mark.parametrize('rotation', ROTATIONS)
+def test_rotation(project, rotation):
+    floorGeometry, ekahauData, rawCoords = project
+    floorIds = [floor_id for floor_id, geometry in floorGeometry.items() if geometry.rotateUpDirection == rotation]
+    assertFloorsAgree(floorGeometry, rawCoords, floorIds)
+
+def test_pre_10_3_project(legacyProject):
+    floorGeometry, ekahauData, rawCoords = legacyProject
+    assert {geometry.rotateUpDirection for geometry in floorGeometry.values()} == {'UP'}
+    assertFloorsAgree(floorGeometry, rawCoords, list(floorGeometry))
+
+def test_different_x_y_scales(project):
+    floorGeometry, ekahauData, rawCoords = project
+    assert any(geometry.x_scale != geometry.y_scale for geometry in floorGeometry.values())
+    for floor_id, geometry in floorGeometry.items():
+        # stretch each generated floor so x and y are scaled far apart
+        stretched = geometry._replace(x_scale=geometry.x_scale * 1.7, y_scale=geometry.y_scale * 0.6)
+        assertFloorsAgree({floor_id: stretched}, rawCoords, [floor_id])
+
+@pytest.mark.parametrize('legacy', [False, True])
+def test_export_matches_scalar(project, legacyProject, legacy):
+    floorGeometry, ekahauData, rawCoords = legacyProject if legacy else project
+    assert len(ekahauData['aps']) == len(rawCoords)
+    for ap in ekahauData['aps']:
+        floor_id, rawX, rawY = rawCoords[ap.name]
+        assert ap.location_id == floor_id
+        assert np.allclose((ap.x, ap.y), scalarAPCoord(floorGeometry[floor_id], rawX, rawY))
+
+def test_unknown_rotation():
+    geometry = FloorGeometry('image', 'regular', 100, 100, 1.0, 1.0, 0, 0, 100, 100, 0.1, 'SIDEWAYS')
+    with pytest.raises(ValueError):
+        transformAPCoords(geometry, np.array([1.0]), np.array([1.0]))
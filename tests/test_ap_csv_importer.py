@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Checks how getSerialNumbers matches the rows of the CSV file to the APs."""
+import os
+import sys
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.ap_csv_importer import apSerialCSV, normalizeName
+
+class AP:
+    def __init__(self, name):
+        self.name = name
+        self.sn = None
+
+def writeCsv(path, rows):
+    with open(path, 'w') as f:
+        f.write("AP Name,Serial Number\n")
+        f.writelines(f"{name},{serial}\n" for name, serial in rows)
+    return str(path)
+
+@pytest.fixture(params=[2, 50000], ids=['small chunks', 'one chunk'])
+def chunkSize(request):
+    return request.param
+
+def test_normalize_name():
+    assert normalizeName(' AP_1.01 ') == normalizeName('ap 1-01') == 'ap-1-01'
+
+def test_exact_match(tmp_path, chunkSize):
+    csvFile = writeCsv(tmp_path / 'aps.csv', [('AP-1', 'S1'), ('AP-1', 'S1b'), ('other', 'O1')])
+    csv = apSerialCSV(csvFile, [AP('AP-1'), AP('AP-2')])
+    matched, unmatchedAps, unmatchedCsv = csv.getSerialNumbers(chunkSize=chunkSize)
+    assert [(ap.name, ap.sn) for ap in matched] == [('AP-1', 'S1')]
+    assert unmatchedAps == ['AP-2']
+    assert unmatchedCsv == ['other']
+    assert csv.duplicates == {'AP-1': ['S1', 'S1b']}
+
+def test_normalized_rows_of_exact_matches_are_unmatched(tmp_path, chunkSize):
+    csvFile = writeCsv(tmp_path / 'aps.csv', [('AP-1', 'S1'), ('ap 1', 'X1')])
+    csv = apSerialCSV(csvFile, [AP('AP-1')])
+    matched, unmatchedAps, unmatchedCsv = csv.getSerialNumbers(chunkSize=chunkSize, match='normalized')
+    assert [(ap.name, ap.sn) for ap in matched] == [('AP-1', 'S1')]
+    assert unmatchedCsv == ['ap 1']
+    assert csv.unmatchedCsvRows == 1
+    assert csv.normalizedMatches == []
+
+def test_repeated_normalized_names_are_duplicates(tmp_path, chunkSize):
+    csvFile = writeCsv(tmp_path / 'aps.csv', [('AP_1', 'S1'), ('ap 1', 'S2')])
+    csv = apSerialCSV(csvFile, [AP('AP-1')])
+    matched, unmatchedAps, unmatchedCsv = csv.getSerialNumbers(chunkSize=chunkSize, match='normalized')
+    assert [(ap.name, ap.sn) for ap in matched] == [('AP-1', 'S1')]
+    assert csv.normalizedMatches == [('AP-1', 'AP_1')]
+    assert csv.duplicates == {'AP_1': ['S1', 'S2']}
+    assert csv.unmatchedCsvRows == 0
+
+def test_ambiguous_normalized_name_is_unmatched(tmp_path, chunkSize):
+    csvFile = writeCsv(tmp_path / 'aps.csv', [('ap.3', 'S3')])
+    csv = apSerialCSV(csvFile, [AP('AP-3'), AP('ap-3')])
+    matched, unmatchedAps, unmatchedCsv = csv.getSerialNumbers(chunkSize=chunkSize, match='normalized')
+    assert matched == []
+    assert unmatchedAps == ['AP-3', 'ap-3']
+    assert unmatchedCsv == ['ap.3']
+    assert csv.unmatchedCsvRows == 1
+
+def test_fuzzy_proposals(tmp_path):
+    csvFile = writeCsv(tmp_path / 'aps.csv', [('Lobby AP 12', 'S12'), ('Lobby AP 13', 'S13')])
+    aps = [AP('Lobby-AP12'), AP('Lobby-AP13')]
+    csv = apSerialCSV(csvFile, aps)
+    matched, unmatchedAps, unmatchedCsv = csv.getSerialNumbers(match='fuzzy')
+    assert matched == []
+    assert [(ap.name, name, serial) for ap, name, serial, score in csv.proposals] == [
+        ('Lobby-AP12', 'Lobby AP 12', 'S12'), ('Lobby-AP13', 'Lobby AP 13', 'S13')]
+
+def test_unknown_match_mode(tmp_path):
+    csv = apSerialCSV(writeCsv(tmp_path / 'aps.csv', []), [])
+    with pytest.raises(ValueError):
+        csv.getSerialNumbers(match='sounds-like')
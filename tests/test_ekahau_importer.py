@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Checks the helpers Ekahau uses to read the members of an .esx archive and encode its floor images."""
+import io
+import json
+import os
+import sys
+import numpy as np
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.Ekahau_importer import encodeJpeg, iterJsonArray, memberBuffer
+
+@pytest.fixture(scope='module')
+def noisyImage():
+    # noise barely compresses, so the byte budgets below need lower qualities or a smaller image
+    return np.random.default_rng(0).integers(0, 256, (300, 400, 3), dtype=np.uint8)
+
+DOCUMENTS = [
+    {'accessPoints': []},
+    {'accessPoints': [1, 22, 333, -4.5e3, True, False, None]},
+    {'accessPoints': [{'id': 'a', 'name': 'AP ] with, "quotes" and \\ slashes', 'tags': ['x', ']', '[{']}]},
+    {'accessPoints': [{'name': 'Café – 3ème étage ✓', 'location': {'coord': {'x': 12.25, 'y': 7}}}] * 3},
+    {'accessPoints': [[[1, [2]], {'accessPoints': [9]}], 'accessPoints']},
+    {'before': {'accessPoints': 'not this one'}, 'accessPoints': [{'id': 1}, {'id': 2}], 'after': [0]},
+]
+
+def stream(document, indent=None):
+    return io.BytesIO(json.dumps(document, indent=indent, ensure_ascii=False).encode('utf-8'))
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+@pytest.mark.parametrize('indent', [None, 2])
+def test_every_chunk_boundary(document, indent):
+    expected = json.loads(stream(document, indent).read())['accessPoints']
+    size = len(stream(document, indent).read())
+    # every element, string and number is split at every possible place by one of these chunk sizes
+    for chunkSize in range(1, size + 2):
+        assert list(iterJsonArray(stream(document, indent), 'accessPoints', chunkSize=chunkSize)) == expected
+
+def test_other_array_of_the_member():
+    document = {'accessPoints': [1], 'floorPlans': [{'id': 'f'}]}
+    assert list(iterJsonArray(stream(document), 'floorPlans', chunkSize=4)) == [{'id': 'f'}]
+
+def test_elements_are_yielded_while_reading():
+    elements = iterJsonArray(stream({'accessPoints': [{'id': i} for i in range(1000)]}), 'accessPoints', chunkSize=64)
+    assert next(elements) == {'id': 0}
+
+@pytest.mark.parametrize('data', [
+    b'{"floorPlans": []}',
+    b'{"accessPoints": [1, 2',
+    b'{"accessPoints": [{"id": 1]}',
+    b'',
+])
+def test_invalid_member(data):
+    with pytest.raises(json.JSONDecodeError):
+        list(iterJsonArray(io.BytesIO(data), 'accessPoints', chunkSize=3))
+
+def decodedShape(buffer):
+    import cv2
+    return cv2.imdecode(np.frombuffer(buffer, np.uint8), cv2.IMREAD_COLOR).shape
+
+def test_encode_at_quality_if_it_fits(noisyImage):
+    buffer, quality, scale = encodeJpeg(noisyImage, 10 ** 7)
+    assert (quality, scale) == (75, 1.0)
+    assert decodedShape(buffer) == noisyImage.shape
+
+def test_encode_at_a_lower_quality(noisyImage):
+    atQuality = encodeJpeg(noisyImage, 10 ** 7)[0].size
+    atMinQuality = encodeJpeg(noisyImage, 10 ** 7, quality=40)[0].size
+    maxBytes = (atQuality + atMinQuality) // 2
+    buffer, quality, scale = encodeJpeg(noisyImage, maxBytes)
+    assert buffer.size <= maxBytes
+    assert 40 <= quality < 75
+    assert scale == 1.0
+    # the binary search found the highest quality that fits
+    assert encodeJpeg(noisyImage, 10 ** 7, quality=quality + 1)[0].size > maxBytes
+
+@pytest.mark.parametrize('ratio', [0.9, 0.5, 0.1])
+def test_downscale_under_max_bytes(noisyImage, ratio):
+    # smaller than the image is even at the lowest quality
+    maxBytes = int(encodeJpeg(noisyImage, 10 ** 7, quality=40)[0].size * ratio)
+    buffer, quality, scale = encodeJpeg(noisyImage, maxBytes)
+    assert buffer.size <= maxBytes
+    assert quality == 40
+    assert scale < 1
+    height, width = decodedShape(buffer)[:2]
+    assert (width, height) == (int(400 * scale), int(300 * scale))
+
+def test_image_that_cannot_fit(noisyImage):
+    with pytest.raises(ValueError):
+        encodeJpeg(noisyImage, 100)
+
+def decodeAndFail(source):
+    # the array made from the buffer stays referenced by the traceback of the error
+    data = np.frombuffer(source, np.uint8)
+    raise ValueError(f"bad image of {data.size} bytes")
+
+@pytest.fixture(scope='module')
+def archive(tmp_path_factory):
+    from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+    filename = str(tmp_path_factory.mktemp('archive') / 'project.esx')
+    with ZipFile(filename, 'w') as zip:
+        zip.writestr('project.json', b'{}', compress_type=ZIP_DEFLATED)
+        zip.writestr('image-stored', bytes(range(256)) * 40, compress_type=ZIP_STORED)
+        zip.writestr('image-deflated', bytes(range(256)) * 40, compress_type=ZIP_DEFLATED)
+    return filename
+
+@pytest.mark.parametrize('name', ['image-stored', 'image-deflated'])
+def test_member_buffer(archive, name):
+    from zipfile import ZipFile
+    with ZipFile(archive) as zip, memberBuffer(zip, name) as source:
+        assert bytes(source) == bytes(range(256)) * 40
+
+@pytest.mark.parametrize('name', ['image-stored', 'image-deflated'])
+def test_member_buffer_keeps_the_error(archive, name):
+    from zipfile import ZipFile
+    with ZipFile(archive) as zip:
+        with pytest.raises(ValueError, match='bad image of 10240 bytes'):
+            with memberBuffer(zip, name) as source:
+                decodeAndFail(source)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Checks the keys, hits and LRU eviction of ImageCache."""
+import os
+import sys
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.image_cache import ImageCache
+
+def setAge(cache, key, mtime):
+    os.utime(os.path.join(cache.directory, f"{key}.jpg"), (mtime, mtime))
+
+def test_key_depends_on_source_and_settings(tmp_path):
+    cache = ImageCache(str(tmp_path))
+    key = cache.key(b'image', 0, 0, 10, 10, 'UP', 1000)
+    assert key == cache.key(b'image', 0, 0, 10, 10, 'UP', 1000)
+    assert key != cache.key(b'image', 0, 0, 10, 10, 'LEFT', 1000)
+    assert key != cache.key(b'image', 0, 0, 10, 10, 'UP', 2000)
+    assert key != cache.key(b'other', 0, 0, 10, 10, 'UP', 1000)
+
+def test_hit_and_miss(tmp_path):
+    cache = ImageCache(str(tmp_path / 'images'))
+    key = cache.key(b'image', 'UP')
+    assert cache.get(key) is None
+    cache.put(key, b'jpeg bytes')
+    assert cache.get(key) == b'jpeg bytes'
+    assert (cache.hits, cache.misses) == (1, 1)
+    # a new instance on the same directory finds it, as the next run does
+    assert ImageCache(str(tmp_path / 'images')).get(key) == b'jpeg bytes'
+
+def test_least_recently_used_is_evicted(tmp_path):
+    cache = ImageCache(str(tmp_path), maxBytes=25)
+    for age, key in enumerate(['a', 'b']):
+        cache.put(key, b'x' * 10)
+        setAge(cache, key, 1000 + age)
+    # reading a makes b the least recently used
+    assert cache.get('a') is not None
+    cache.put('c', b'x' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+def test_entry_larger_than_the_cache(tmp_path):
+    cache = ImageCache(str(tmp_path), maxBytes=5)
+    cache.put('big', b'x' * 10)
+    assert cache.get('big') is None
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_unusable_directory(tmp_path):
+    (tmp_path / 'file').write_text('')
+    with pytest.raises(ValueError):
+        ImageCache(str(tmp_path / 'file' / 'images'))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Checks when ProjectCache finds the entry of an .esx file again."""
+import os
+import shutil
+import sys
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from esx_generator import generateEsx
+from app import Ekahau_importer
+from app.Ekahau_importer import Ekahau
+from app.image_cache import ImageCache
+from app.project_cache import ProjectCache
+
+def writeProject(path, content=b'esx bytes'):
+    path.write_bytes(content)
+    return str(path)
+
+def test_hit_and_miss(tmp_path):
+    cache = ProjectCache(str(tmp_path / 'projects'))
+    esxFile = writeProject(tmp_path / 'a.esx')
+    assert cache.get(esxFile, 1000) is None
+    cache.put(esxFile, {'aps': []}, {'floor.jpg': 'key'}, 1000)
+    assert cache.get(esxFile, 1000) == ({'aps': []}, {'floor.jpg': 'key'})
+    # other settings are another entry
+    assert cache.get(esxFile, 2000) is None
+
+def test_touched_or_copied_file_hits(tmp_path):
+    cache = ProjectCache(str(tmp_path / 'projects'))
+    esxFile = writeProject(tmp_path / 'a.esx')
+    cache.put(esxFile, {'aps': []}, {}, 1000)
+    stat = os.stat(esxFile)
+    os.utime(esxFile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.get(esxFile, 1000) is not None
+    copy = shutil.copy(esxFile, tmp_path / 'copy.esx')
+    assert cache.get(str(copy), 1000) is not None
+
+def test_changed_file_misses(tmp_path):
+    cache = ProjectCache(str(tmp_path / 'projects'))
+    esxFile = writeProject(tmp_path / 'a.esx')
+    cache.put(esxFile, {'aps': []}, {}, 1000)
+    # same size, only the content and mtime change
+    stat = os.stat(esxFile)
+    writeProject(tmp_path / 'a.esx', b'esx BYTES')
+    os.utime(esxFile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.get(esxFile, 1000) is None
+
+def test_corrupt_entry_misses(tmp_path):
+    cache = ProjectCache(str(tmp_path / 'projects'))
+    esxFile = writeProject(tmp_path / 'a.esx')
+    cache.put(esxFile, {'aps': []}, {}, 1000)
+    for name in os.listdir(tmp_path / 'projects'):
+        if name.endswith('.pickle'):
+            (tmp_path / 'projects' / name).write_bytes(b'not a pickle')
+    assert cache.get(esxFile, 1000) is None
+
+@pytest.fixture
+def noArchive(monkeypatch):
+    """Fails any read of the .esx archive, so only a project cache hit can export"""
+    def fail(*args, **kwargs):
+        raise AssertionError("the archive was read")
+    return lambda: monkeypatch.setattr(Ekahau_importer, 'ZipFile', fail)
+
+def exportProject(esxFile, cacheDir, imageDir):
+    imageCache = ImageCache(os.path.join(cacheDir, 'images'))
+    ekahau = Ekahau(esxFile, imageCache=imageCache, projectCache=ProjectCache(os.path.join(cacheDir, 'projects')),
+                    imageDir=imageDir)
+    ekahauData = ekahau.exportFile()
+    images = {name: open(os.path.join(imageDir, name), 'rb').read() for name in sorted(os.listdir(imageDir))}
+    return ekahauData, images, imageCache
+
+def test_export_from_the_cache(tmp_path, noArchive):
+    esxFile = str(tmp_path / 'project.esx')
+    generateEsx(esxFile, buildings=1, floors=3, aps=5, resolution=(300, 200))
+    cacheDir = str(tmp_path / 'cache')
+    exported, exportedImages, imageCache = exportProject(esxFile, cacheDir, str(tmp_path / 'first'))
+    assert imageCache.misses == 3
+    noArchive()
+    cached, cachedImages, imageCache = exportProject(esxFile, cacheDir, str(tmp_path / 'second'))
+    assert (imageCache.hits, imageCache.misses) == (3, 0)
+    assert cachedImages == exportedImages
+    assert [floor.map_name for floor in cached['floors']] == [floor.map_name for floor in exported['floors']]
+    assert [(ap.name, ap.x, ap.y) for ap in cached['aps']] == [(ap.name, ap.x, ap.y) for ap in exported['aps']]
+
+def test_evicted_image_exports_again(tmp_path, noArchive):
+    esxFile = str(tmp_path / 'project.esx')
+    generateEsx(esxFile, buildings=1, floors=3, aps=5, resolution=(300, 200))
+    cacheDir = str(tmp_path / 'cache')
+    exported, exportedImages, _ = exportProject(esxFile, cacheDir, str(tmp_path / 'first'))
+    imagesDir = os.path.join(cacheDir, 'images')
+    os.remove(os.path.join(imagesDir, sorted(os.listdir(imagesDir))[0]))
+    cached, cachedImages, imageCache = exportProject(esxFile, cacheDir, str(tmp_path / 'second'))
+    assert cachedImages == exportedImages
+    assert len(os.listdir(imagesDir)) == 3
+    # the entry was written again, the next export is a hit
+    noArchive()
+    cached, cachedImages, imageCache = exportProject(esxFile, cacheDir, str(tmp_path / 'third'))
+    assert (imageCache.hits, imageCache.misses) == (3, 0)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Checks the token bucket of RateLimiter, alone and shared through a lock file."""
+import json
+import os
+import sys
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app import rate_limiter
+from app.rate_limiter import RateLimiter
+
+class Clock:
+    """Fake monotonic and wall clocks that only move when the limiter sleeps"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def time(self):
+        return self.now
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock.time)
+    monkeypatch.setattr(rate_limiter.time, 'time', clock.time)
+    return clock
+
+def test_burst_then_spaced_by_rate():
+    limiter = RateLimiter(4, burst=3)
+    waits = [limiter.acquire() for _ in range(6)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3:] == pytest.approx([0.25, 0.25, 0.25])
+    assert limiter.calls == 6
+    assert limiter.delayed == 3
+    assert limiter.waited == pytest.approx(0.75)
+
+def test_bucket_refills_while_idle(clock):
+    limiter = RateLimiter(2, burst=2)
+    limiter.acquire()
+    limiter.acquire()
+    clock.sleep(10)
+    # only burst tokens are kept however long it was idle
+    assert [limiter.acquire() for _ in range(3)] == pytest.approx([0, 0, 0.5])
+
+def test_default_burst_is_the_rate():
+    assert RateLimiter(5).burst == 5
+    assert RateLimiter(0.5).burst == 1
+
+@pytest.mark.parametrize('rate, burst', [(0, None), (-1, None), (5, 0), (5, -2)])
+def test_invalid_rate_or_burst(rate, burst):
+    with pytest.raises(ValueError):
+        RateLimiter(rate, burst=burst)
+
+def test_limiters_share_a_lock_file(tmp_path):
+    lockFile = str(tmp_path / 'xiq.rate')
+    first = RateLimiter(2, burst=2, lockFile=lockFile)
+    second = RateLimiter(2, burst=2, lockFile=lockFile)
+    assert first.acquire() == 0
+    assert second.acquire() == 0
+    # the bucket of both is empty now
+    assert first.acquire() == pytest.approx(0.5)
+    assert second.acquire() == pytest.approx(0.5)
+
+def test_corrupt_lock_file_is_reset(tmp_path):
+    lockFile = tmp_path / 'xiq.rate'
+    lockFile.write_text('not json')
+    limiter = RateLimiter(2, burst=2, lockFile=str(lockFile))
+    assert limiter.acquire() == 0
+    state = json.loads(lockFile.read_text())
+    assert state['tokens'] == pytest.approx(1)
+
+def test_wall_clock_stepping_back(tmp_path, clock):
+    lockFile = tmp_path / 'xiq.rate'
+    # the bucket was last updated 100 secs in the future of the wall clock, as if the clock was stepped back
+    lockFile.write_text(json.dumps({'tokens': 0, 'updated': clock.now + 100}))
+    limiter = RateLimiter(2, burst=2, lockFile=str(lockFile))
+    # the step back is not counted as a negative refill, the bucket continues from now
+    assert limiter.acquire() == pytest.approx(0.5)
+    assert json.loads(lockFile.read_text())['updated'] == pytest.approx(clock.now - 0.5)
+
+def test_unusable_lock_file_limits_this_import_only(tmp_path):
+    lockFile = tmp_path / 'xiq.rate'
+    limiter = RateLimiter(2, burst=1, lockFile=str(lockFile))
+    lockFile.unlink()
+    os.mkdir(lockFile)
+    assert limiter.acquire() == 0
+    assert limiter.lockFile is None
+    assert limiter.acquire() == pytest.approx(0.5)
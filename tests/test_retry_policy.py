@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Checks when RetryPolicy retries a failed XIQ call and how long it waits."""
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import os
+import sys
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app import retry_policy
+from app.retry_policy import APIError, RetryPolicy, retryAfter
+
+@pytest.fixture(autouse=True)
+def sleeps(monkeypatch):
+    # no real waits, and every backoff is the largest one allowed
+    waits = []
+    monkeypatch.setattr(retry_policy.time, 'sleep', waits.append)
+    monkeypatch.setattr(retry_policy.random, 'uniform', lambda low, high: high)
+    return waits
+
+class Calls:
+    """Raises the given errors in turn, then returns 'ok'"""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+class Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+def test_idempotent_5xx_is_retried(sleeps):
+    function = Calls(APIError('500', status=500), APIError('502', status=502))
+    assert RetryPolicy(baseDelay=1.0).call('get', function) == 'ok'
+    assert function.count == 3
+    assert sleeps == [1.0, 2.0]
+
+def test_non_idempotent_5xx_is_not_retried(sleeps):
+    function = Calls(APIError('500', status=500))
+    with pytest.raises(APIError):
+        RetryPolicy().call('post', function, idempotent=False)
+    assert function.count == 1
+    assert sleeps == []
+
+@pytest.mark.parametrize('idempotent', [True, False])
+def test_unsent_error_is_retried(idempotent):
+    function = Calls(APIError('connect timeout', sent=False))
+    assert RetryPolicy().call('post', function, idempotent=idempotent) == 'ok'
+    assert function.count == 2
+
+@pytest.mark.parametrize('status, retried', [(400, False), (404, False), (408, True)])
+def test_4xx_is_not_retried_but_408(status, retried):
+    function = Calls(APIError(str(status), status=status))
+    if retried:
+        assert RetryPolicy().call('get', function) == 'ok'
+    else:
+        with pytest.raises(APIError):
+            RetryPolicy().call('get', function)
+    assert function.count == (2 if retried else 1)
+
+def test_throttled_call_waits_retry_after_without_using_attempts(sleeps):
+    throttled = [APIError('429', status=429, retryAfter=7.0) for _ in range(4)]
+    function = Calls(*throttled)
+    assert RetryPolicy(attempts=2, baseDelay=1.0).call('get', function) == 'ok'
+    assert function.count == 5
+    # at least the Retry-After, more once the backoff grows past it
+    assert sleeps == [7.0, 7.0, 7.0, 8.0]
+
+def test_throttled_call_uses_attempts_after_max_throttle_wait(sleeps):
+    function = Calls(*(APIError('503', status=503, retryAfter=4.0) for _ in range(10)))
+    with pytest.raises(APIError):
+        RetryPolicy(attempts=2, maxThrottleWait=10.0).call('put', function, idempotent=False)
+    # two free waits of 4 secs, then the one retry of its 2 attempts
+    assert function.count == 4
+    assert sleeps == [4.0, 4.0, 4.0]
+
+def test_retry_after_is_capped(sleeps):
+    function = Calls(APIError('429', status=429, retryAfter=3600.0))
+    RetryPolicy(maxRetryAfter=120.0).call('get', function)
+    assert sleeps == [120.0]
+
+def test_delay_backs_off_up_to_max_delay():
+    policy = RetryPolicy(baseDelay=1.0, maxDelay=30.0)
+    assert [policy.delay(tries) for tries in range(1, 7)] == [1.0, 2.0, 4.0, 8.0, 16.0, 30.0]
+    assert policy.delay(1, retryAfter=5.0) == 5.0
+
+def test_budget_runs_out_and_is_refilled():
+    policy = RetryPolicy(attempts=3, budget=2, budgetRefill=0.1)
+    failing = Calls(*(APIError('500', status=500) for _ in range(10)))
+    with pytest.raises(APIError):
+        policy.call('get', failing)
+    assert failing.count == 3
+    assert policy.budget == 0
+    # no retries are left, the next failure is raised at once
+    failing = Calls(APIError('500', status=500))
+    with pytest.raises(APIError):
+        policy.call('get', failing)
+    assert failing.count == 1
+    for _ in range(10):
+        policy.call('get', Calls())
+    assert policy.budget == 1
+    # the retry takes the refilled retry, its success gives back a tenth
+    assert policy.call('get', Calls(APIError('500', status=500))) == 'ok'
+    assert policy.budget == 0.1
+    for _ in range(50):
+        policy.call('get', Calls())
+    assert policy.budget == policy.maxBudget == 2
+
+def test_no_budget_is_unlimited():
+    policy = RetryPolicy(attempts=3)
+    for _ in range(20):
+        assert policy.call('get', Calls(APIError('500', status=500), APIError('500', status=500))) == 'ok'
+    assert policy.budget is None
+
+def test_retry_after_seconds():
+    assert retryAfter(Response({'Retry-After': '12'})) == 12.0
+    assert retryAfter(Response({'Retry-After': '-3'})) == 0.0
+    assert retryAfter(Response({})) is None
+    assert retryAfter(Response({'Retry-After': 'soon'})) is None
+
+def test_retry_after_http_date():
+    date = datetime.now(timezone.utc) + timedelta(seconds=90)
+    assert 85 <= retryAfter(Response({'Retry-After': format_datetime(date, usegmt=True)})) <= 90
+    assert retryAfter(Response({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0.0
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""Checks the span names the XIQ calls are timed under with --profile."""
+import os
+import sys
+import pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from app.xiq_exporter import profilePath
+
+@pytest.mark.parametrize('url, path', [
+    ('https://api.extremecloudiq.com/locations/tree', '/locations/tree'),
+    ('https://api.extremecloudiq.com/locations/building/4509', '/locations/building/{id}'),
+    ('https://api.extremecloudiq.com/devices/12/location?x=1', '/devices/{id}/location'),
+    ('https://api.extremecloudiq.com/operations/6b1f0e9c2a7d4c13', '/operations/{id}'),
+    ('https://api.extremecloudiq.com/operations/2f1c9a4e-7b3d-4e8a-9c0f-1d2e3f4a5b6c', '/operations/{id}'),
+    ('http://127.0.0.1:8765/operations/00ff00ff00ff', '/operations/{id}'),
+    ('https://api.extremecloudiq.com/network-policies', '/network-policies'),
+    ('https://api.extremecloudiq.com/devices/:advanced-onboard', '/devices/:advanced-onboard'),
+    ('https://api.extremecloudiq.com/msp/external-accounts/:switch', '/msp/external-accounts/:switch'),
+])
+def test_ids_are_grouped(url, path):
+    assert profilePath(url) == path